@@ -0,0 +1,110 @@
+"""Порівняння затримки БД під конкурентними апдейтами: старий sqlite3.connect на кожен виклик
+проти async-шару database.db (одне WAL-з'єднання у виділеному потоці).
+
+Запуск з кореня репозиторію:  python -m bench.bench_db --users 5000 --updates 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from database import db
+
+
+def seed(path, users):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE user_prefs (user_id INTEGER PRIMARY KEY, language TEXT DEFAULT 'uk', "
+                 "notify_off INTEGER DEFAULT 1, notify_on INTEGER DEFAULT 1, "
+                 "notify_off_10 INTEGER DEFAULT 1, notify_on_10 INTEGER DEFAULT 1)")
+    conn.executemany("INSERT INTO user_prefs (user_id, language) VALUES (?, ?)",
+                     ((i, 'uk' if i % 2 else 'ru') for i in range(users)))
+    conn.commit()
+    conn.close()
+
+
+def legacy_get_lang(path, user_id):
+    # Як було: нове з'єднання на кожен виклик, синхронно в event loop
+    with sqlite3.connect(path) as conn:
+        conn.row_factory = sqlite3.Row
+        res = conn.execute("SELECT language FROM user_prefs WHERE user_id = ?", (user_id,)).fetchone()
+        return res['language'] if res else 'uk'
+
+
+def legacy_set(path, user_id, value):
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE user_prefs SET notify_off = ? WHERE user_id = ?", (value, user_id))
+        conn.commit()
+
+
+async def legacy_update(path, user_id):
+    legacy_get_lang(path, user_id)
+    legacy_set(path, user_id, user_id % 2)
+    legacy_get_lang(path, user_id)
+
+
+async def async_update(user_id):
+    await db.fetchone("SELECT language FROM user_prefs WHERE user_id = ?", (user_id,))
+    await db.execute("UPDATE user_prefs SET notify_off = ? WHERE user_id = ?", (user_id % 2, user_id))
+    await db.fetchone("SELECT language FROM user_prefs WHERE user_id = ?", (user_id,))
+
+
+async def measure(make_update, users, updates, concurrency):
+    """Запускає updates апдейтів по concurrency одночасно; міряє затримку та блокування loop."""
+    latencies = []
+    max_lag = 0.0
+    stop = False
+
+    async def ticker():
+        # Наскільки пізно прокидається таймер на 10 мс — це і є блокування event loop
+        nonlocal max_lag
+        while not stop:
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            max_lag = max(max_lag, time.perf_counter() - start - 0.01)
+
+    async def one(i):
+        start = time.perf_counter()
+        await make_update(i * 7919 % users)
+        latencies.append(time.perf_counter() - start)
+
+    tick = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    for offset in range(0, updates, concurrency):
+        await asyncio.gather(*(one(i) for i in range(offset, min(offset + concurrency, updates))))
+    total = time.perf_counter() - started
+    stop = True
+    await tick
+
+    latencies.sort()
+    return {
+        'updates_per_s': round(updates / total, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 3),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 3),
+        'max_loop_block_ms': round(max_lag * 1000, 3),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        seed(path, args.users)
+        before = await measure(lambda uid: legacy_update(path, uid), args.users, args.updates, args.concurrency)
+
+        db.DB_PATH = path
+        after = await measure(async_update, args.users, args.updates, args.concurrency)
+
+    print(json.dumps({'before': before, 'after': after}, indent=2))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+"""CPU-час на підготовку клавіатури в хендлері: побудова InlineKeyboardMarkup/ReplyKeyboardMarkup
+на кожен виклик (як було) проти готового JSON з handlers.keyboards.
+
+Міряється те, що хендлер робить до мережевого запиту: побудова розмітки + серіалізація reply_markup
+(aiogram.utils.payload.prepare_arg, як у Bot.send_message).
+Запуск з кореня репозиторію:  python -m bench.bench_keyboards --iterations 20000
+"""
+import argparse
+import json
+import time
+
+from aiogram import types
+from aiogram.utils.payload import prepare_arg
+
+from handlers import keyboards
+from handlers.keyboards import cb_menu, cb_notify, cb_sched
+from locales.strings import get_text
+
+
+# --- Як було в handlers/client.py ---
+def legacy_main_menu_kb(lang):
+    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    kb.row(get_text(lang, 'btn_add_queue'), get_text(lang, 'btn_my_queues'))
+    kb.row(get_text(lang, 'btn_schedules'))
+    kb.row(get_text(lang, 'btn_settings'), get_text(lang, 'btn_support'))
+    return kb
+
+
+def legacy_queues_kb(action_type, company, lang):
+    queues = ["1.1", "1.2", "2.1", "2.2", "3.1", "3.2", "4.1", "4.2", "5.1", "5.2", "6.1", "6.2"]
+    kb = types.InlineKeyboardMarkup(row_width=3)
+    btns = []
+    for q in queues:
+        if action_type == 'view':
+            btns.append(types.InlineKeyboardButton(q, callback_data=cb_sched.new(comp=company, queue=q)))
+        else:
+            btns.append(types.InlineKeyboardButton(q, callback_data=cb_menu.new(action='save', val=f"{company}_{q}")))
+    kb.add(*btns)
+    back_call = "back_view" if action_type == 'view' else "back_sub"
+    kb.add(types.InlineKeyboardButton(get_text(lang, 'back'), callback_data=back_call))
+    return kb
+
+
+def legacy_settings_kb(lang):
+    kb = types.InlineKeyboardMarkup(row_width=1)
+    kb.add(types.InlineKeyboardButton(get_text(lang, 'btn_lang_switch'), callback_data="open_lang"))
+    kb.add(types.InlineKeyboardButton(get_text(lang, 'btn_notifications'), callback_data="open_notifications"))
+    kb.add(types.InlineKeyboardButton(get_text(lang, 'btn_toggle_all'), callback_data="toggle_all"))
+    return kb
+
+
+def legacy_notifications_kb(lang, settings):
+    def state_emoji(v): return "✅" if int(v) == 1 else "❌"
+
+    kb = types.InlineKeyboardMarkup(row_width=1)
+    for key in keyboards.NOTIFY_KEYS:
+        label = get_text(lang, 'notif_label_' + key[len('notify_'):])
+        kb.add(types.InlineKeyboardButton(f"{label}: {state_emoji(settings[key])}",
+                                          callback_data=cb_notify.new(key=key, val=settings[key])))
+    kb.add(types.InlineKeyboardButton(get_text(lang, 'back'), callback_data="open_settings_back"))
+    return kb
+
+
+SETTINGS = {'notify_off': 1, 'notify_on': 0, 'notify_off_10': 1, 'notify_on_10': 1}
+
+CASES = {
+    'main_menu': (lambda: legacy_main_menu_kb('uk'),
+                  lambda: keyboards.get('main_menu', 'uk')),
+    'queues': (lambda: legacy_queues_kb('view', 'ДТЕК', 'ru'),
+               lambda: keyboards.get('queues_view', 'ru', 'ДТЕК')),
+    'settings': (lambda: legacy_settings_kb('uk'),
+                 lambda: keyboards.get('settings', 'uk')),
+    'notifications': (lambda: legacy_notifications_kb('uk', SETTINGS),
+                      lambda: keyboards.notifications('uk', SETTINGS)),
+}
+
+
+def measure(build, iterations):
+    start = time.process_time()
+    for _ in range(iterations):
+        prepare_arg(build())
+    return (time.process_time() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    start = time.process_time()
+    keyboards.build()
+    build_ms = (time.process_time() - start) * 1000
+
+    report = {'build_once_ms': round(build_ms, 2)}
+    for name, (legacy, cached) in CASES.items():
+        # Результат має бути однаковим
+        assert json.loads(prepare_arg(legacy())) == json.loads(prepare_arg(cached())), name
+        before = measure(legacy, args.iterations)
+        after = measure(cached, args.iterations)
+        report[name] = {'before_us': round(before, 2), 'after_us': round(after, 3), 'speedup': round(before / after, 1)}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Порівняння перебудови розкладу: APScheduler (date-job на кожне нагадування) проти services.timeline.
+
+Для кожного розміру міряє час додавання N подій і пам'ять, яку займає планувальник після цього.
+Запуск з кореня репозиторію:  python -m bench.bench_timeline --sizes 10000,100000,1000000
+
+APScheduler у боті більше не використовується; для порівняння його треба встановити окремо
+(pip install apscheduler==3.10.4). Вставка в його MemoryJobStore — O(n), тому розміри понад
+--apscheduler-max для нього пропускаються.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from services.timeline import Timeline
+
+QUEUES = ["1.1", "1.2", "2.1", "2.2", "3.1", "3.2", "4.1", "4.2", "5.1", "5.2", "6.1", "6.2"]
+ACTIONS = ('off', 'off_now', 'on', 'on_now')
+
+
+def make_events(n, seed=1):
+    rnd = random.Random(seed)
+    start = datetime.now(timezone.utc) + timedelta(hours=1)
+    for i in range(n):
+        run_at = start + timedelta(seconds=rnd.randrange(0, 7 * 24 * 3600))
+        yield run_at, ("ДТЕК", QUEUES[i % 12], run_at.strftime('%Y-%m-%d'), f"{i % 1440:04d}", ACTIONS[i % 4])
+
+
+async def noop(*args):
+    pass
+
+
+def build_apscheduler(events):
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    scheduler = AsyncIOScheduler()
+    scheduler.start()
+    for run_at, key in events:
+        # Як було: date-job з аргументами bot, user_id, company, queue, action, lang
+        scheduler.add_job(noop, 'date', run_date=run_at, args=[None, 1, key[0], key[1], key[4], 'uk'])
+    return scheduler
+
+
+def build_timeline(events):
+    timeline = Timeline(noop)
+    for run_at, key in events:
+        timeline.add(run_at.timestamp(), key)
+    return timeline
+
+
+def measure(build, events):
+    gc.collect()
+    start = time.perf_counter()
+    obj = build(events)
+    elapsed = time.perf_counter() - start
+    if hasattr(obj, 'shutdown'):
+        obj.shutdown(wait=False)
+    del obj
+
+    gc.collect()
+    tracemalloc.start()
+    obj = build(events)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    if hasattr(obj, 'shutdown'):
+        obj.shutdown(wait=False)
+    return {'rebuild_s': round(elapsed, 3), 'memory_mb': round(memory / 2 ** 20, 1)}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--apscheduler-max', type=int, default=100000)
+    args = parser.parse_args()
+
+    try:
+        import apscheduler  # noqa: F401
+        have_apscheduler = True
+    except ImportError:
+        have_apscheduler = False
+
+    report = {}
+    for size in (int(s) for s in args.sizes.split(',')):
+        events = list(make_events(size))
+        row = {'timeline': measure(build_timeline, events)}
+        if have_apscheduler and size <= args.apscheduler_max:
+            row['apscheduler'] = measure(build_apscheduler, events)
+        else:
+            row['apscheduler'] = None
+        report[size] = row
+        print(size, json.dumps(row), flush=True)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
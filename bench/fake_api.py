@@ -0,0 +1,101 @@
+"""Локальна заміна Telegram Bot API для навантажувальних тестів.
+
+Відповідає на /bot<token>/<method> як справжній API (sendMessage, editMessageText, answerCallbackQuery...)
+із заданою затримкою; частина запитів отримує 429 (retry_after), частина чатів — 403 «bot was blocked».
+Лічильники запитів — GET /stats. Бот спрямовується сюди через TELEGRAM_API_SERVER:
+
+    python -m bench.fake_api --port 8081 --latency 0.03 --rate-429 0.01
+    TELEGRAM_API_SERVER=http://127.0.0.1:8081 python main.py
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from aiohttp import web
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+
+
+class FakeApi:
+    def __init__(self, latency=0.03, jitter=0.01, rate_429=0.0, retry_after=1, blocked=0.0, seed=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.blocked = blocked
+        self.random = random.Random(seed)
+        self.requests = {}
+        self.errors = {'429': 0, '403': 0}
+        self.started = time.time()
+        self.message_ids = 0
+
+    def _is_blocked(self, chat_id):
+        # Стабільно для чату: той самий користувач «заблокував» бота в усіх запитах
+        return self.blocked and (chat_id * 2654435761) % 10000 < self.blocked * 10000
+
+    def _message(self, data):
+        self.message_ids += 1
+        return {
+            'message_id': self.message_ids,
+            'date': int(time.time()),
+            'chat': {'id': int(data.get('chat_id', 0)), 'type': 'private'},
+            'from': BOT_USER,
+            'text': data.get('text', ''),
+        }
+
+    async def handle(self, request):
+        method = request.match_info['method']
+        data = dict(await request.post()) if request.can_read_body else {}
+        self.requests[method] = self.requests.get(method, 0) + 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(self.latency + self.random.uniform(-self.jitter, self.jitter), 0))
+
+        if method in ('sendMessage', 'editMessageText'):
+            if self.rate_429 and self.random.random() < self.rate_429:
+                self.errors['429'] += 1
+                return web.json_response({
+                    'ok': False, 'error_code': 429,
+                    'description': f"Too Many Requests: retry after {self.retry_after}",
+                    'parameters': {'retry_after': self.retry_after},
+                }, status=429)
+            if self._is_blocked(int(data.get('chat_id', 0))):
+                self.errors['403'] += 1
+                return web.json_response({'ok': False, 'error_code': 403,
+                                          'description': 'Forbidden: bot was blocked by the user'}, status=403)
+            return web.json_response({'ok': True, 'result': self._message(data)})
+        if method == 'getMe':
+            return web.json_response({'ok': True, 'result': BOT_USER})
+        return web.json_response({'ok': True, 'result': True})
+
+    async def stats(self, request):
+        return web.json_response(self.snapshot())
+
+    def snapshot(self):
+        return {'requests': dict(self.requests), 'errors': dict(self.errors),
+                'elapsed_s': round(time.time() - self.started, 2)}
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        app.router.add_get('/stats', self.stats)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.03, help='затримка відповіді, с')
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--rate-429', type=float, default=0.0, help='частка відповідей 429 на відправку')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--blocked', type=float, default=0.0, help='частка чатів, що «заблокували» бота')
+    args = parser.parse_args()
+
+    api = FakeApi(args.latency, args.jitter, args.rate_429, args.retry_after, args.blocked)
+    web.run_app(api.app(), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == '__main__':
+    main()
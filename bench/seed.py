@@ -0,0 +1,113 @@
+"""Синтетичні дані для навантажувальних тестів: користувачі, підписки, налаштування й графіки.
+
+Схема створюється міграціями бота, події графіка матеріалізуються так само, як при завантаженні.
+Запуск з кореня репозиторію:
+
+    python -m bench.seed --db bench.db --users 50000
+    python -m bench.seed --preset large --db bench.db --force
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from database import schedule_events
+from database.migrations import migrate
+from handlers.keyboards import COMPANIES, QUEUES
+
+# Розміри: користувачів (підписок у середньому ~2 на користувача)
+PRESETS = {'small': 1000, 'medium': 50000, 'large': 500000}
+
+
+def _intervals(rnd, count):
+    """count непересічних інтервалів вимкнення на добу (HH:MM), останній може закінчуватися о 24:00."""
+    starts = sorted(rnd.sample(range(0, 24, 2), count))
+    result = []
+    for start in starts:
+        end = min(start + rnd.choice((1, 2)), 24)
+        result.append((f"{start:02d}:00", f"{end:02d}:00" if end < 24 else "24:00"))
+    return result
+
+
+def seed(path, users, max_subs=3, days=3, intervals=3, seed=1):
+    """Створює БД path з users користувачами; графіки — з учора на days днів уперед. Повертає лічильники."""
+    rnd = random.Random(seed)
+    started = time.perf_counter()
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    migrate(conn)
+
+    slices = [(company, queue) for company in COMPANIES for queue in QUEUES]
+    base_uid = 10 ** 6
+
+    def subscriptions():
+        for i in range(users):
+            for company, queue in rnd.sample(slices, rnd.randint(1, max_subs)):
+                yield base_uid + i, company, queue
+
+    def prefs():
+        for i in range(users):
+            # Більшість нічого не вимикає; кожен п'ятий вимкнув одне зі сповіщень
+            flags = [1, 1, 1, 1]
+            if i % 5 == 0:
+                flags[rnd.randrange(4)] = 0
+            yield (base_uid + i, 'uk' if i % 3 else 'ru', *flags)
+
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO users (user_id, company, queue) VALUES (?, ?, ?)", subscriptions())
+        conn.executemany(
+            "INSERT OR REPLACE INTO user_prefs (user_id, language, notify_off, notify_on, notify_off_10, notify_on_10) "
+            "VALUES (?, ?, ?, ?, ?, ?)", prefs()
+        )
+
+    today = datetime.now(schedule_events.UA_TZ).date()
+    rows = []
+    for day in range(-1, days):
+        date_str = (today + timedelta(days=day)).strftime('%Y-%m-%d')
+        for company, queue in slices:
+            for off_time, on_time in _intervals(rnd, intervals):
+                rows.append((company, queue, date_str, off_time, on_time))
+    with conn:
+        conn.executemany("INSERT INTO schedules (company, queue, date, off_time, on_time) VALUES (?, ?, ?, ?, ?)", rows)
+        schedule_events.materialize(conn, rows)
+
+    counts = {
+        'users': users,
+        'subscriptions': conn.execute("SELECT COUNT(*) FROM users").fetchone()[0],
+        'schedules': len(rows),
+        'schedule_events': conn.execute("SELECT COUNT(*) FROM schedule_events").fetchone()[0],
+        'seed_s': round(time.perf_counter() - started, 2),
+        'db_mb': round(sum(os.path.getsize(f) for f in (path, path + '-wal') if os.path.exists(f)) / 2 ** 20, 1),
+    }
+    conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default='database.db')
+    parser.add_argument('--preset', choices=sorted(PRESETS))
+    parser.add_argument('--users', type=int, default=PRESETS['small'])
+    parser.add_argument('--max-subs', type=int, default=3, help='підписок на користувача (1..max)')
+    parser.add_argument('--days', type=int, default=3, help='днів графіка, починаючи з сьогодні')
+    parser.add_argument('--intervals', type=int, default=3, help='інтервалів вимкнення на чергу за добу')
+    parser.add_argument('--force', action='store_true', help='перезаписати наявну БД')
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        if not args.force:
+            parser.error(f"{args.db} вже існує (--force, щоб перезаписати)")
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+    users = PRESETS[args.preset] if args.preset else args.users
+    print(json.dumps(seed(args.db, users, args.max_subs, args.days, args.intervals), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+"""Відтворюваний навантажувальний прогін бота на синтетичних даних і локальній заміні Bot API.
+
+1. Засіває тимчасову БД (bench/seed.py) — користувачі, підписки, графіки.
+2. Запускає bench/fake_api.py окремим процесом (затримка, 429, «заблоковані» чати).
+3. Піднімає бота в цьому процесі (main.on_startup) і проганяє:
+   rebuild_jobs, клієнтські хендлери (суміш апдейтів через dispatcher), upload_schedule, notify_users_about_update.
+4. Друкує JSON: пропускна здатність, p50/p99, піковий RSS, блокування event loop, запити до API.
+
+Запуск з кореня репозиторію:
+    python -m bench.suite --preset small
+    python -m bench.suite --users 50000 --latency 0.05 --rate-429 0.01 --blocked 0.02 --out bench.json
+
+--send-rate — глобальний ліміт розсилок (у проді 30/с); за замовчуванням вищий, щоб міряти накладні витрати бота.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import aiohttp
+
+from bench.seed import PRESETS, seed
+from bench.webhook_load import make_update, percentile
+
+
+class LoopMonitor:
+    """Наскільки пізно прокидається таймер на 10 мс — це і є блокування event loop."""
+
+    INTERVAL = 0.01
+
+    def __init__(self):
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self._task = None
+
+    async def _tick(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.INTERVAL)
+            lag = time.perf_counter() - start - self.INTERVAL
+            self.max_lag = max(self.max_lag, lag)
+            self.total_lag += max(lag, 0)
+
+    def __enter__(self):
+        self._task = asyncio.create_task(self._tick())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+    def report(self):
+        return {'max_loop_block_ms': round(self.max_lag * 1000, 2),
+                'loop_blocked_ms_total': round(self.total_lag * 1000, 1)}
+
+
+def _rss_mb():
+    # ru_maxrss у Linux — КБ
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _latency_report(latencies, elapsed):
+    return {
+        'count': len(latencies),
+        'elapsed_s': round(elapsed, 3),
+        'per_s': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def _start_fake_api(args, port):
+    proc = subprocess.Popen([
+        sys.executable, '-m', 'bench.fake_api', '--port', str(port), '--latency', str(args.latency),
+        '--jitter', str(args.jitter), '--rate-429', str(args.rate_429), '--retry-after', str(args.retry_after),
+        '--blocked', str(args.blocked),
+    ])
+    async with aiohttp.ClientSession() as session:
+        for _ in range(100):
+            try:
+                async with session.get(f'http://127.0.0.1:{port}/stats'):
+                    return proc
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError('fake_api не запустився')
+
+
+def _callback_update(update_id, user_id, data):
+    return {'update_id': update_id, 'callback_query': {
+        'id': str(update_id), 'chat_instance': '1', 'data': data,
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'load'},
+        'message': {'message_id': 1, 'date': int(time.time()), 'chat': {'id': user_id, 'type': 'private'},
+                    'text': '...'},
+    }}
+
+
+def _client_updates(count, users, rnd):
+    """Суміш апдейтів, як від живих користувачів: меню, перегляд графіків, налаштування сповіщень."""
+    from handlers.keyboards import COMPANIES, NOTIFY_KEYS, QUEUES, cb_day, cb_notify, cb_sched
+    tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+    for update_id in range(1, count + 1):
+        uid = 10 ** 6 + rnd.randrange(users)
+        kind = rnd.random()
+        if kind < 0.1:
+            yield make_update(update_id, uid, '/start')
+        elif kind < 0.25:
+            yield make_update(update_id, uid, rnd.choice(['📅 Графіки', '📋 Мої черги', '⚙️ Налаштування']))
+        elif kind < 0.6:
+            yield _callback_update(update_id, uid, cb_sched.new(comp=rnd.choice(COMPANIES), queue=rnd.choice(QUEUES)))
+        elif kind < 0.75:
+            yield _callback_update(update_id, uid, cb_day.new(comp=rnd.choice(COMPANIES), queue=rnd.choice(QUEUES),
+                                                              date=tomorrow))
+        elif kind < 0.85:
+            yield _callback_update(update_id, uid, 'open_notifications')
+        else:
+            yield _callback_update(update_id, uid, cb_notify.new(key=rnd.choice(NOTIFY_KEYS), val=rnd.randint(0, 1)))
+
+
+async def bench_handlers(main, args, rnd):
+    from aiogram import types
+    from services import dispatch
+
+    async def process(update):
+        if isinstance(main.dp, dispatch.OrderedDispatcher):
+            await (await dispatch.submit(main.dp, update))
+        else:
+            await main.dp.updates_handler.notify(update)
+
+    updates = iter([types.Update(**u) for u in _client_updates(args.updates, args.users, rnd)])
+    latencies = []
+
+    async def worker():
+        for update in updates:
+            start = time.perf_counter()
+            await process(update)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return _latency_report(latencies, time.perf_counter() - start)
+
+
+async def bench_rebuild(main, repeats=3):
+    from services.scheduler import rebuild_jobs
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        await rebuild_jobs(main.timeline)
+        timings.append(time.perf_counter() - start)
+    report = _latency_report(timings, sum(timings))
+    report['events'] = len(main.timeline)
+    return report
+
+
+def _upload_text(company, date, rnd):
+    from handlers.keyboards import QUEUES
+    lines = [f"/upload {company} {date.strftime('%d.%m.%Y')}"]
+    for queue in QUEUES:
+        lines.append(f"Черга {queue}")
+        start = rnd.randrange(0, 20)
+        lines.append(f"{start:02d}:30 - {start + 3:02d}:30")
+    return '\n'.join(lines)
+
+
+async def bench_upload(main, rnd):
+    """Завантаження графіка адміном: розбір, запис, перепланування й розсилка змін підписникам компанії."""
+    import config
+    from aiogram import types
+    from handlers.keyboards import COMPANIES
+    date = datetime.now() + timedelta(days=1)
+    update = types.Update(**make_update(10 ** 7, config.ADMIN_ID, _upload_text(COMPANIES[0], date, rnd)))
+    start = time.perf_counter()
+    await main.dp.updates_handler.notify(update)
+    # Підсумок розсилки хендлер надсилає у фоні — чекаємо й на нього
+    from handlers import admin
+    await asyncio.gather(*admin._delivery_reports)
+    return {'elapsed_s': round(time.perf_counter() - start, 3)}
+
+
+async def bench_notify(main, limit):
+    """Розсилка «графік оновлено» для всіх черг на завтра (fan-out через outbox)."""
+    from handlers.admin import notify_users_about_update
+    from handlers.keyboards import COMPANIES, QUEUES
+    date_str = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+    updated = {(company, queue, date_str) for company in COMPANIES for queue in QUEUES}
+    if limit:
+        updated = set(sorted(updated)[:limit])
+    start = time.perf_counter()
+    stats = await notify_users_about_update(updated, f"bench:{time.time()}")
+    elapsed = time.perf_counter() - start
+    sends = stats['delivered'] + stats['failed'] + stats['blocked'] - stats['saved']
+    return dict(stats, queues=len(updated), elapsed_s=round(elapsed, 3),
+                messages_per_s=round(sends / elapsed, 1) if elapsed else None)
+
+
+async def _measure(name, results, coro):
+    with LoopMonitor() as monitor:
+        result = await coro
+    result.update(monitor.report())
+    result['rss_mb'] = _rss_mb()
+    results[name] = result
+    print(f"{name}: {json.dumps(result)}", file=sys.stderr)
+
+
+async def run(args):
+    rnd = random.Random(args.seed)
+    results = {'config': {k: v for k, v in vars(args).items() if k != 'out'}}
+    with tempfile.TemporaryDirectory(prefix='light-bench-') as tmp:
+        return await _run(args, rnd, results, args.db or os.path.join(tmp, 'bench.db'))
+
+
+async def _run(args, rnd, results, path):
+    results['seed'] = seed(path, args.users, days=args.days)
+    print(f"seed: {json.dumps(results['seed'])}", file=sys.stderr)
+
+    port = _free_port()
+    api = await _start_fake_api(args, port)
+    try:
+        # Бот імпортується після налаштування: Bot створюється при імпорті main
+        import config
+        config.TELEGRAM_API_SERVER = f'http://127.0.0.1:{port}'
+        config.METRICS_PORT = 0
+        config.RUN_MODE = 'polling'
+        from database import db
+        db.DB_PATH = path
+        import main
+        from aiogram import Bot, Dispatcher
+        from services import broadcast, leader
+        broadcast.bucket = broadcast.TokenBucket(args.send_rate)
+        Bot.set_current(main.bot)
+        Dispatcher.set_current(main.dp)
+
+        await main.on_startup(main.dp)
+        for _ in range(200):
+            if leader.is_leader():
+                break
+            await asyncio.sleep(0.1)
+
+        await _measure('rebuild_jobs', results, bench_rebuild(main))
+        await _measure('client_handlers', results, bench_handlers(main, args, rnd))
+        await _measure('upload_schedule', results, bench_upload(main, rnd))
+        await _measure('notify_users_about_update', results, bench_notify(main, args.notify_queues))
+
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f'http://127.0.0.1:{port}/stats') as resp:
+                results['api'] = await resp.json()
+        results['peak_rss_mb'] = _rss_mb()
+        await main.on_shutdown(main.dp)
+        await (await main.bot.get_session()).close()
+    finally:
+        api.terminate()
+        api.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--preset', choices=sorted(PRESETS), help='small/medium/large = 1k/50k/500k користувачів')
+    parser.add_argument('--users', type=int, default=PRESETS['small'])
+    parser.add_argument('--days', type=int, default=3)
+    parser.add_argument('--db', help='шлях до БД (за замовчуванням — тимчасова)')
+    parser.add_argument('--updates', type=int, default=2000, help='клієнтських апдейтів')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--notify-queues', type=int, default=0, help='скільки черг у розсилці (0 — усі)')
+    parser.add_argument('--send-rate', type=float, default=1000, help='глобальний ліміт відправок/с')
+    parser.add_argument('--latency', type=float, default=0.03)
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--blocked', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help='куди записати JSON (крім stdout)')
+    args = parser.parse_args()
+    if args.preset:
+        args.users = PRESETS[args.preset]
+    if args.db and os.path.exists(args.db):
+        parser.error(f"{args.db} вже існує — потрібна нова БД")
+
+    # Логи бота (print) — у stderr, щоб stdout лишався чистим JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        results = asyncio.run(run(args))
+    report = json.dumps(results, indent=2, ensure_ascii=False)
+    print(report)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
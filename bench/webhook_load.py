@@ -0,0 +1,88 @@
+"""Навантаження на вебхук синтетичними апдейтами — без Telegram.
+
+Шле POST-запити з текстовими повідомленнями від багатьох користувачів і міряє пропускну здатність
+та затримку відповіді вебхука (p50/p95/p99). Бот запускається окремо в режимі вебхука, наприклад:
+
+    RUN_MODE=webhook WEBHOOK_SECRET=test python main.py
+    python -m bench.webhook_load --url http://127.0.0.1:8080/webhook --secret test --updates 5000
+
+Відповіді бота йдуть на api.telegram.org; щоб не чіпати справжній API, використовуйте тестовий токен.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import statistics
+import time
+
+import aiohttp
+
+from services.webhook import SECRET_HEADER
+
+TEXTS = ['/start', '📅 Графіки', '📋 Мої черги', '⚙️ Налаштування']
+
+
+def make_update(update_id, user_id, text):
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'load'},
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+    return {'update_id': update_id, 'message': message}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8080/webhook')
+    parser.add_argument('--secret', default='test', help='WEBHOOK_SECRET бота')
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=50, help='одночасні з\'єднання (як max_connections)')
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    ids = itertools.count(1)
+    headers = {SECRET_HEADER: args.secret}
+    latencies = []
+    statuses = {}
+
+    async def worker(session):
+        while True:
+            update_id = next(ids)
+            if update_id > args.updates:
+                return
+            body = make_update(update_id, 10 ** 6 + rnd.randrange(args.users), rnd.choice(TEXTS))
+            start = time.perf_counter()
+            async with session.post(args.url, json=body, headers=headers) as resp:
+                await resp.read()
+            latencies.append(time.perf_counter() - start)
+            statuses[resp.status] = statuses.get(resp.status, 0) + 1
+
+    start = time.perf_counter()
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.concurrency)) as session:
+        await asyncio.gather(*(worker(session) for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        'updates': len(latencies),
+        'elapsed_s': round(elapsed, 2),
+        'updates_per_s': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'statuses': statuses,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -6,4 +6,43 @@ CHANNEL_ID = '@lightmetech'
 CHANNEL_URL = 'https://t.me/lightmetech'
 SUPPORT_USER = '@imnotafire'
 DONATE_URL = 'https://send.monobank.ua/jar/2LX7RwKWn9'
-DB_NAME = 'bot_database.db'
\ No newline at end of file
+DB_NAME = 'bot_database.db'
+
+# Адреса Bot API: порожньо — api.telegram.org; інакше локальний Bot API server або bench/fake_api.py
+TELEGRAM_API_SERVER = os.getenv('TELEGRAM_API_SERVER', '')
+
+# Режим отримання апдейтів: 'polling' або 'webhook'
+RUN_MODE = os.getenv('RUN_MODE', 'polling')
+# Публічна адреса, на яку Telegram шле апдейти (наприклад https://bot.example.com)
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+# Секрет для заголовка X-Telegram-Bot-Api-Secret-Token (1-256 символів A-Z, a-z, 0-9, _ та -); обов'язковий для RUN_MODE=webhook
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBAPP_HOST = os.getenv('WEBAPP_HOST', '0.0.0.0')
+WEBAPP_PORT = int(os.getenv('PORT', 8080))
+# Вебхук: max_connections для Telegram; у режимі DISPATCH_MODE='default' — ще й скільки апдейтів обробляється
+# одночасно (решта чекає, Telegram отримує відповідь пізніше). У режимі 'ordered' межа — DISPATCH_MAX_CONCURRENCY
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv('WEBHOOK_MAX_CONCURRENCY', 100))
+# Скільки секунд при зупинці чекати на апдейти, що ще обробляються
+WEBHOOK_DRAIN_TIMEOUT = int(os.getenv('WEBHOOK_DRAIN_TIMEOUT', 30))
+
+# Обробка апдейтів: 'ordered' — апдейти одного чату по черзі, різних чатів паралельно (services/dispatch.py);
+# 'default' — як в aiogram, окрема задача на кожен апдейт
+DISPATCH_MODE = os.getenv('DISPATCH_MODE', 'ordered')
+# Скільки апдейтів (різних чатів) обробляється одночасно
+DISPATCH_MAX_CONCURRENCY = int(os.getenv('DISPATCH_MAX_CONCURRENCY', 100))
+# Скільки апдейтів може чекати в чергах; далі нові не приймаються: вебхук відповідає Telegram пізніше,
+# а polling не викликає getUpdates (offset не зсувається), поки не звільниться місце
+DISPATCH_MAX_QUEUE = int(os.getenv('DISPATCH_MAX_QUEUE', 5000))
+# Скільки апдейтів одного чату може чекати, перш ніж нові натискання кнопок відкидаються
+DISPATCH_PER_CHAT_LIMIT = int(os.getenv('DISPATCH_PER_CHAT_LIMIT', 10))
+# Повторні натискання тієї ж кнопки, поки попереднє ще в черзі: 'coalesce' (лишається останнє), 'shed' (нове відкидається), 'none'
+DISPATCH_CALLBACK_POLICY = os.getenv('DISPATCH_CALLBACK_POLICY', 'coalesce')
+
+# Планувальник тримає в пам'яті лише події найближчих годин; далі вікно дозаповнюється
+SCHEDULER_WINDOW_HOURS = float(os.getenv('SCHEDULER_WINDOW_HOURS', 6))
+
+# Метрики у форматі Prometheus: http://METRICS_HOST:METRICS_PORT/metrics (0 — вимкнено)
+# Кілька воркерів на одному хості: порт отримує перший, решта працюють без /metrics (або задайте різні METRICS_PORT)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9100))
@@ -0,0 +1,40 @@
+"""Журнал изменений для других процессов.
+
+Воркеры делят одну БД, но держат состояние в памяти: лидер — таймеры графика и доставку outbox,
+каждый воркер — кэш настроек пользователей. Запись в журнал делается в той же транзакции,
+что и само изменение; читатели раз в несколько секунд забирают строки с seq больше последнего.
+"""
+import time
+
+# Виды записей
+SCHEDULE = 'schedule'  # изменились интервалы очереди (company, queue, date)
+PREFS = 'prefs'        # изменились настройки пользователя user_id
+OUTBOX = 'outbox'      # в outbox появились новые пачки
+
+
+def log(conn, kind, company=None, queue=None, date_str=None, user_id=None):
+    conn.execute(
+        "INSERT INTO changes (kind, company, queue, date, user_id, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (kind, company, queue, date_str, user_id, int(time.time()))
+    )
+
+
+def log_slices(conn, slices):
+    """Записывает изменённые очереди графика [(company, queue, date), ...]."""
+    now = int(time.time())
+    conn.executemany(
+        "INSERT INTO changes (kind, company, queue, date, created_at) VALUES (?, ?, ?, ?, ?)",
+        ((SCHEDULE, company, queue, date_str, now) for company, queue, date_str in slices)
+    )
+
+
+def last_seq(conn):
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+
+def fetch(conn, after):
+    return conn.execute("SELECT * FROM changes WHERE seq > ? ORDER BY seq", (after,)).fetchall()
+
+
+def cleanup(conn, before):
+    conn.execute("DELETE FROM changes WHERE created_at < ?", (before,))
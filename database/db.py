@@ -1,5 +1,13 @@
+import asyncio
+import functools
 import sqlite3
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from database.cache import LRUCache
+from database import changes
+from database.migrations import migrate
+from services import metrics
 
 # Визначаємо шлях до бази даних для Railway Volume
 if os.path.exists('/app/data'):
@@ -7,125 +15,206 @@ if os.path.exists('/app/data'):
 else:
     DB_PATH = 'database.db'
 
+# Одно долгоживущее соединение; все запросы выполняются в выделенном потоке,
+# поэтому ожидание диска не блокирует event loop
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+_conn = None
+
+# Кэш настроек пользователей: user_id -> dict (language + notify_*)
+prefs_cache = LRUCache(maxsize=50000, ttl=600)
+
+PREF_KEYS = ('language', 'notify_off', 'notify_on', 'notify_off_10', 'notify_on_10')
+# Лимит параметров в одном запросе SQLite
+_IN_CHUNK = 900
+
+DB_SECONDS = metrics.histogram('db_query_seconds', 'Время транзакции в потоке БД', labels=('query',))
+DB_WAIT_SECONDS = metrics.histogram('db_queue_wait_seconds', 'Ожидание свободного потока БД')
+DB_ERRORS = metrics.counter('db_errors_total', 'Ошибки запросов к БД', labels=('query',))
+
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Возвращает общее соединение (WAL). Вызывать только из потока БД — через run()."""
+    global _conn
+    if _conn is None:
+        # cached_statements: скомпилированные запросы переиспользуются между вызовами
+        _conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=256)
+        _conn.row_factory = sqlite3.Row
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute("PRAGMA busy_timeout=5000")
+    return _conn
 
-def get_tech_mode():
-    """Перевіряє режим технічних робіт для Middleware"""
-    try:
-        with get_db() as conn:
-            res = conn.execute("SELECT status FROM settings WHERE key = 'tech_mode'").fetchone()
-            return res['status'] == 1 if res else False
-    except:
-        return False
-
-def ensure_user_prefs_columns(conn):
-    """Добавляет отсутствующие колонки для user_prefs (безопасно для существующей БД)."""
+def _call(func, args):
+    conn = get_db()
+    start = time.perf_counter()
+    # Одна транзакция на вызов: commit при успехе, rollback при ошибке
+    with conn:
+        result = func(conn, *args)
+    return result, time.perf_counter() - start
+
+async def run(func, *args, label=None):
+    """Выполняет func(conn, *args) в потоке БД в одной транзакции и возвращает результат.
+
+    Время транзакции попадает в метрику db_query_seconds с меткой label (по умолчанию — имя func).
+    """
+    label = label or func.__name__
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
     try:
-        existing = {row['name'] for row in conn.execute("PRAGMA table_info(user_prefs)").fetchall()}
+        result, elapsed = await loop.run_in_executor(_executor, functools.partial(_call, func, args))
     except Exception:
-        existing = set()
-    cols_to_add = {
-        'notify_off': "INTEGER DEFAULT 1",
-        'notify_on': "INTEGER DEFAULT 1",
-        'notify_off_10': "INTEGER DEFAULT 1",
-        'notify_on_10': "INTEGER DEFAULT 1",
+        DB_ERRORS.inc(label)
+        raise
+    DB_SECONDS.observe(elapsed, label)
+    DB_WAIT_SECONDS.observe(max(time.perf_counter() - started - elapsed, 0))
+    return result
+
+@functools.lru_cache(maxsize=512)
+def _sql_label(sql):
+    """Метка запроса для метрик: операция и таблица ('SELECT users'), без параметров."""
+    words = sql.replace('(', ' ').split()
+    op = words[0].upper() if words else ''
+    if op == 'UPDATE' and len(words) > 1:
+        return f"UPDATE {words[1]}"
+    upper = [w.upper() for w in words]
+    for marker in ('FROM', 'INTO'):
+        if marker in upper:
+            i = upper.index(marker)
+            if i + 1 < len(words):
+                return f"{op} {words[i + 1]}"
+    return op
+
+def _fetchone(conn, sql, params):
+    return conn.execute(sql, params).fetchone()
+
+def _fetchall(conn, sql, params):
+    return conn.execute(sql, params).fetchall()
+
+def _execute(conn, sql, params):
+    return conn.execute(sql, params).rowcount
+
+def _executemany(conn, sql, seq_of_params):
+    return conn.executemany(sql, seq_of_params).rowcount
+
+async def fetchone(sql, params=()):
+    return await run(_fetchone, sql, params, label=_sql_label(sql))
+
+async def fetchall(sql, params=()):
+    return await run(_fetchall, sql, params, label=_sql_label(sql))
+
+async def execute(sql, params=()):
+    """Выполняет изменяющий запрос, возвращает количество затронутых строк."""
+    return await run(_execute, sql, params, label=_sql_label(sql))
+
+async def executemany(sql, seq_of_params):
+    return await run(_executemany, sql, seq_of_params, label=_sql_label(sql))
+
+def _default_prefs(user_id, language='uk'):
+    return {
+        'user_id': user_id,
+        'language': language,
+        'notify_off': 1,
+        'notify_on': 1,
+        'notify_off_10': 1,
+        'notify_on_10': 1,
     }
-    for col, dtype in cols_to_add.items():
-        if col not in existing:
-            try:
-                conn.execute(f"ALTER TABLE user_prefs ADD COLUMN {col} {dtype}")
-            except Exception:
-                # ALTER may fail in rare cases; ignore to keep app running
-                pass
-
-def get_user_settings(user_id):
-    """Возвращает словарь с настройками пользователя (включая язык) и создаёт запись если её нет."""
-    with get_db() as conn:
-        # Убедимся, что таблица user_prefs содержит нужные колонки
-        ensure_user_prefs_columns(conn)
-
-        row = conn.execute("SELECT user_id, language, notify_off, notify_on, notify_off_10, notify_on_10 FROM user_prefs WHERE user_id = ?", (user_id,)).fetchone()
-        if row:
-            return {
-                'user_id': row['user_id'],
-                'language': row['language'] or 'uk',
-                'notify_off': 1 if row['notify_off'] is None else row['notify_off'],
-                'notify_on': 1 if row['notify_on'] is None else row['notify_on'],
-                'notify_off_10': 1 if row['notify_off_10'] is None else row['notify_off_10'],
-                'notify_on_10': 1 if row['notify_on_10'] is None else row['notify_on_10'],
-            }
+
+def _prefs_from_row(row):
+    prefs = _default_prefs(row['user_id'], row['language'] or 'uk')
+    for key in PREF_KEYS[1:]:
+        if row[key] is not None:
+            prefs[key] = row[key]
+    return prefs
+
+def _load_prefs(conn, user_ids):
+    """Читает настройки пачкой; для пользователей без записи — значения по умолчанию."""
+    result = {uid: _default_prefs(uid) for uid in user_ids}
+    for i in range(0, len(user_ids), _IN_CHUNK):
+        chunk = user_ids[i:i + _IN_CHUNK]
+        rows = conn.execute(
+            "SELECT user_id, language, notify_off, notify_on, notify_off_10, notify_on_10 FROM user_prefs "
+            f"WHERE user_id IN ({','.join('?' * len(chunk))})", chunk
+        ).fetchall()
+        for row in rows:
+            result[row['user_id']] = _prefs_from_row(row)
+    return result
+
+async def get_prefs_many(user_ids):
+    """Настройки для списка пользователей: из кэша, недостающие — одним запросом на пачку."""
+    result = {}
+    missing = []
+    for uid in user_ids:
+        cached = prefs_cache.get(uid)
+        if cached is None:
+            missing.append(uid)
         else:
-            # Создаём запись с дефолтными значениями
-            conn.execute("""
-                INSERT OR REPLACE INTO user_prefs (user_id, language, notify_off, notify_on, notify_off_10, notify_on_10)
-                VALUES (?, 'uk', 1, 1, 1, 1)
-            """, (user_id,))
-            conn.commit()
-            return {
-                'user_id': user_id,
-                'language': 'uk',
-                'notify_off': 1,
-                'notify_on': 1,
-                'notify_off_10': 1,
-                'notify_on_10': 1,
-            }
-
-def set_user_setting(user_id, key, value):
-    """Устанавливает одно поле настройки (key) для пользователя (INSERT или UPDATE)."""
-    allowed = {'language', 'notify_off', 'notify_on', 'notify_off_10', 'notify_on_10'}
-    if key not in allowed:
-        raise ValueError("Not allowed setting key")
-    with get_db() as conn:
-        # Убедимся, что запись существует
-        row = conn.execute("SELECT user_id FROM user_prefs WHERE user_id = ?", (user_id,)).fetchone()
-        if not row:
-            conn.execute("INSERT INTO user_prefs (user_id) VALUES (?)", (user_id,))
-        conn.execute(f"UPDATE user_prefs SET {key} = ? WHERE user_id = ?", (value, user_id))
-        conn.commit()
-
-def init_db():
-    with get_db() as conn:
-        # Таблиця підписок
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                company TEXT,
-                queue TEXT,
-                UNIQUE(user_id, company, queue)
-            )
-        ''')
-        # Таблиця налаштувань мови (расширим далее через ALTER если нужно)
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS user_prefs (
-                user_id INTEGER PRIMARY KEY,
-                language TEXT DEFAULT 'uk'
-            )
-        ''')
-        # Добавим недостающие колонки, если таблица уже существовала
-        ensure_user_prefs_columns(conn)
-
-        # Таблиця графіків
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS schedules (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                company TEXT,
-                date TEXT,
-                queue TEXT,
-                off_time TEXT,
-                on_time TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        # Таблиця системних налаштувань (тех. роботи)
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS settings (
-                key TEXT PRIMARY KEY,
-                status INTEGER DEFAULT 0
-            )
-        ''')
-        conn.commit()
+            result[uid] = cached
+    if missing:
+        loaded = await run(_load_prefs, missing)
+        for uid, prefs in loaded.items():
+            prefs_cache.set(uid, prefs)
+        result.update(loaded)
+    return result
+
+async def get_user_lang(user_id):
+    """Язык пользователя (через кэш настроек)."""
+    prefs = await get_prefs_many([user_id])
+    return prefs[user_id]['language']
+
+async def get_user_settings(user_id):
+    """Возвращает словарь с настройками пользователя (включая язык); без записи — значения по умолчанию."""
+    prefs = await get_prefs_many([user_id])
+    return dict(prefs[user_id])
+
+def _update_prefs(conn, user_id, values):
+    columns = list(values)
+    # Один UPSERT: создаёт запись или меняет только переданные колонки, остальные не трогает
+    row = conn.execute(
+        f"INSERT INTO user_prefs (user_id, {', '.join(columns)}) VALUES (?{', ?' * len(columns)}) "
+        f"ON CONFLICT(user_id) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in columns)} "
+        "RETURNING user_id, language, notify_off, notify_on, notify_off_10, notify_on_10",
+        (user_id, *values.values())
+    ).fetchone()
+    # Другие воркеры сбросят эту запись в своём кэше
+    changes.log(conn, changes.PREFS, user_id=user_id)
+    return _prefs_from_row(row)
+
+async def update_prefs(user_id, **values):
+    """Меняет любой набор настроек (language, notify_*) одной транзакцией. Возвращает новые настройки."""
+    unknown = set(values) - set(PREF_KEYS)
+    if unknown or not values:
+        raise ValueError(f"Not allowed setting keys: {sorted(unknown)}")
+    prefs = await run(_update_prefs, user_id, values)
+    prefs_cache.set(user_id, prefs)
+    return dict(prefs)
+
+async def set_language(user_id, lang):
+    """Сохраняет язык пользователя (настройки уведомлений не меняются)."""
+    return await update_prefs(user_id, language=lang)
+
+def _deactivate_users(conn, rows):
+    now = int(time.time())
+    conn.executemany(
+        "UPDATE users SET active = 0, inactive_reason = ?, inactive_since = ? WHERE user_id = ? AND active = 1",
+        [(reason, now, user_id) for user_id, reason in rows]
+    )
+
+async def deactivate_users(rows):
+    """Исключает недоступных пользователей [(user_id, причина), ...] из рассылок (подписки сохраняются)."""
+    await run(_deactivate_users, rows)
+
+def _reactivate_user(conn, user_id):
+    return conn.execute(
+        "UPDATE users SET active = 1, inactive_reason = NULL, inactive_since = NULL WHERE user_id = ? AND active = 0",
+        (user_id,)
+    ).rowcount
+
+async def reactivate_user(user_id):
+    """Возвращает пользователя в рассылки (после /start). Возвращает число восстановленных подписок."""
+    return await run(_reactivate_user, user_id)
+
+async def init_db():
+    """Применяет миграции схемы (один раз при старте)."""
+    old, new = await run(migrate)
+    if old != new:
+        print(f"🛠 Міграції БД: версія {old} → {new}")
     print(f"✅ База даних ініціалізована за шляхом: {DB_PATH}")
@@ -0,0 +1,191 @@
+"""Версионированные миграции схемы на основе PRAGMA user_version.
+
+Каждая миграция выполняется один раз (из init_db) в своей транзакции;
+добавлять новые — только в конец списка MIGRATIONS.
+"""
+from database.schedule_events import materialize
+
+
+def _m001_base_schema(conn):
+    # Таблиця підписок
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            company TEXT,
+            queue TEXT,
+            UNIQUE(user_id, company, queue)
+        )
+    ''')
+    # Таблиця налаштувань мови та сповіщень
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_prefs (
+            user_id INTEGER PRIMARY KEY,
+            language TEXT DEFAULT 'uk'
+        )
+    ''')
+    # Старые БД могли быть созданы без колонок notify_*
+    existing = {row['name'] for row in conn.execute("PRAGMA table_info(user_prefs)").fetchall()}
+    for col in ('notify_off', 'notify_on', 'notify_off_10', 'notify_on_10'):
+        if col not in existing:
+            conn.execute(f"ALTER TABLE user_prefs ADD COLUMN {col} INTEGER DEFAULT 1")
+
+    # Таблиця графіків
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schedules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company TEXT,
+            date TEXT,
+            queue TEXT,
+            off_time TEXT,
+            on_time TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Таблиця системних налаштувань (тех. роботи)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            status INTEGER DEFAULT 0
+        )
+    ''')
+
+def _m002_hot_path_indexes(conn):
+    # Подписчики очереди при рассылке: покрывающий индекс, таблица не читается
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_company_queue ON users (company, queue, user_id)")
+    # Просмотр графика очереди на дату (show_sched)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_schedules_company_queue_date "
+        "ON schedules (company, queue, date, off_time, on_time, created_at)"
+    )
+    # Планировщик: date >= ? при старте и (company, date) после загрузки
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_schedules_date ON schedules (date, company)")
+
+def _m003_outbox(conn):
+    # Очередь рассылок: одна строка — одно событие/обновление для очереди (company, queue);
+    # получатели раскрываются при доставке, прогресс — в outbox_sent
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dedup_key TEXT NOT NULL UNIQUE,
+            kind TEXT NOT NULL,
+            company TEXT,
+            queue TEXT,
+            date TEXT,
+            action TEXT,
+            run_at INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            delivered INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            blocked INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            done_at TIMESTAMP
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_status_run_at ON outbox (status, run_at)")
+    # Кому уже доставлено: после рестарта эти получатели пропускаются
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS outbox_sent (
+            outbox_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            PRIMARY KEY (outbox_id, user_id)
+        ) WITHOUT ROWID
+    ''')
+
+def _m004_schedule_events(conn):
+    # Готовые UTC epoch-метки событий графика: планировщик делает range scan по run_at
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schedule_events (
+            company TEXT NOT NULL,
+            queue TEXT NOT NULL,
+            date TEXT NOT NULL,
+            interval TEXT NOT NULL,
+            action TEXT NOT NULL,
+            run_at INTEGER NOT NULL,
+            PRIMARY KEY (company, queue, date, interval, action)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_schedule_events_run_at ON schedule_events (run_at)")
+    # Заполняем по уже загруженным графикам (история не нужна — только со вчерашнего дня)
+    rows = conn.execute(
+        "SELECT company, queue, date, off_time, on_time FROM schedules WHERE date >= date('now', '-1 day')"
+    ).fetchall()
+    materialize(conn, [tuple(row) for row in rows])
+
+def _m005_workers(conn):
+    # Аренда роли: строка с владельцем и сроком; продлевается heartbeat-ом лидера
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at INTEGER NOT NULL
+        )
+    ''')
+    # Журнал изменений между воркерами (см. database/changes.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            company TEXT,
+            queue TEXT,
+            date TEXT,
+            user_id INTEGER,
+            created_at INTEGER NOT NULL
+        )
+    ''')
+
+def _m006_outbox_groups(conn):
+    # Пачки с одинаковым group_key доставляются вместе: один пользователь — одно сообщение;
+    # saved — сколько отдельных отправок сэкономлено за счёт объединения
+    conn.execute("ALTER TABLE outbox ADD COLUMN group_key TEXT")
+    conn.execute("ALTER TABLE outbox ADD COLUMN saved INTEGER DEFAULT 0")
+
+def _m007_inactive_users(conn):
+    # Пользователь, заблокировавший бота (или удалённый), исключается из рассылок до следующего /start
+    conn.execute("ALTER TABLE users ADD COLUMN active INTEGER NOT NULL DEFAULT 1")
+    conn.execute("ALTER TABLE users ADD COLUMN inactive_reason TEXT")
+    conn.execute("ALTER TABLE users ADD COLUMN inactive_since INTEGER")
+    # Частичный индекс: подписчики очереди при рассылке — только активные
+    conn.execute("DROP INDEX IF EXISTS idx_users_company_queue")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_active_company_queue "
+        "ON users (company, queue, user_id) WHERE active = 1"
+    )
+
+def _m008_outbox_deadlines(conn):
+    # run_at — когда начать рассылку (для больших очередей раньше события), due_at — само событие;
+    # skew_first/skew_last — отклонение первой и последней доставки от due_at, сек
+    conn.execute("ALTER TABLE outbox ADD COLUMN due_at INTEGER")
+    conn.execute("ALTER TABLE outbox ADD COLUMN skew_first REAL")
+    conn.execute("ALTER TABLE outbox ADD COLUMN skew_last REAL")
+
+def _m009_outbox_attempts(conn):
+    # Неудачные попытки доставки пачки; после outbox.MAX_ATTEMPTS пачка получает статус 'failed'
+    conn.execute("ALTER TABLE outbox ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE outbox ADD COLUMN last_error TEXT")
+
+MIGRATIONS = [
+    _m001_base_schema,
+    _m002_hot_path_indexes,
+    _m003_outbox,
+    _m004_schedule_events,
+    _m005_workers,
+    _m006_outbox_groups,
+    _m007_inactive_users,
+    _m008_outbox_deadlines,
+    _m009_outbox_attempts,
+]
+
+def migrate(conn):
+    """Применяет недостающие миграции. Возвращает (старая версия, новая версия)."""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, migration in enumerate(MIGRATIONS[current:], start=current + 1):
+        conn.execute("BEGIN")
+        try:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return current, len(MIGRATIONS)
@@ -0,0 +1,48 @@
+import asyncio
+from database import db
+
+# Интервал, с которым проверяем изменения от других процессов
+REFRESH_INTERVAL = 5
+
+# Текущие значения в памяти; читаются без обращения к БД
+_state = {'tech_mode': False}
+_version = 0
+
+def tech_mode():
+    """Режим технических работ (значение в памяти)."""
+    return _state['tech_mode']
+
+def _read_all(conn):
+    rows = conn.execute("SELECT key, status FROM settings").fetchall()
+    return {row['key']: row['status'] for row in rows}
+
+def _write(conn, key, status):
+    conn.execute("INSERT OR REPLACE INTO settings (key, status) VALUES (?, ?)", (key, status))
+    # Счётчик версии: другие процессы замечают изменение одним дешёвым запросом
+    conn.execute("INSERT OR IGNORE INTO settings (key, status) VALUES ('version', 0)")
+    conn.execute("UPDATE settings SET status = status + 1 WHERE key = 'version'")
+    return _read_all(conn)
+
+def _apply(values):
+    global _state, _version
+    # Новый словарь подменяется целиком, чтобы читатели не видели частичного состояния
+    _state = {'tech_mode': values.get('tech_mode', 0) == 1}
+    _version = values.get('version', 0)
+
+async def load():
+    """Загружает настройки из БД (при старте и после изменений в других процессах)."""
+    _apply(await db.run(_read_all))
+
+async def set_tech_mode(enabled):
+    _apply(await db.run(_write, 'tech_mode', 1 if enabled else 0))
+
+async def watch():
+    """Фоновая задача: перечитывает настройки, если версия в БД изменилась."""
+    while True:
+        await asyncio.sleep(REFRESH_INTERVAL)
+        try:
+            row = await db.fetchone("SELECT status FROM settings WHERE key = 'version'")
+            if row and row['status'] != _version:
+                await load()
+        except Exception as e:
+            print("Failed to refresh runtime settings:", e)
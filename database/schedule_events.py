@@ -0,0 +1,63 @@
+"""Материализованные события графика: готовые UTC epoch-метки для каждого off/on и напоминаний.
+
+Строки пишутся при загрузке графика, поэтому планировщик и просмотры делают
+обычный range scan по run_at без разбора строк времени.
+"""
+import pytz
+from datetime import datetime, timedelta
+
+UA_TZ = pytz.timezone('Europe/Kyiv')
+
+# Напоминание за 10 минут до события
+LEAD_TIME = 10 * 60
+
+
+def _minutes(hhmm):
+    hours, minutes = hhmm.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def _epoch(date_str, minutes):
+    # 24:00 и интервалы через полночь дают minutes >= 1440 — это просто следующие сутки
+    naive = datetime.strptime(date_str, '%Y-%m-%d') + timedelta(minutes=minutes)
+    return int(UA_TZ.localize(naive).timestamp())
+
+
+def compute_events(date_str, off_time, on_time):
+    """Возвращает [(action, run_at), ...] для интервала off_time-on_time на дату date_str."""
+    off_min = _minutes(off_time)
+    on_min = _minutes(on_time)
+    if on_min <= off_min:
+        # Интервал переходит через полночь: включение уже на следующий день
+        on_min += 24 * 60
+    off_at = _epoch(date_str, off_min)
+    on_at = _epoch(date_str, on_min)
+    return [
+        ('off', off_at - LEAD_TIME),  # Напоминание о выключении за 10 минут
+        ('off_now', off_at),          # Уведомление в момент выключения
+        ('on', on_at - LEAD_TIME),    # Напоминание о включении за 10 минут
+        ('on_now', on_at),            # Уведомление в момент включения
+    ]
+
+
+def materialize(conn, rows):
+    """Записывает события для строк графика [(company, queue, date, off_time, on_time), ...]."""
+    events = []
+    for company, queue, date_str, off_time, on_time in rows:
+        try:
+            for action, run_at in compute_events(date_str, off_time, on_time):
+                events.append((company, queue, date_str, f"{off_time}-{on_time}", action, run_at))
+        except ValueError as e:
+            print("Bad schedule interval:", company, queue, date_str, off_time, on_time, e)
+    conn.executemany(
+        "INSERT OR REPLACE INTO schedule_events (company, queue, date, interval, action, run_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)", events
+    )
+
+
+def drop(conn, rows):
+    """Удаляет события для строк графика [(company, queue, date, off_time, on_time), ...]."""
+    conn.executemany(
+        "DELETE FROM schedule_events WHERE company = ? AND queue = ? AND date = ? AND interval = ?",
+        ((company, queue, date_str, f"{off_time}-{on_time}") for company, queue, date_str, off_time, on_time in rows)
+    )
@@ -1,71 +1,177 @@
+import asyncio
+import io
 from aiogram import Dispatcher, types
+from aiogram.utils.markdown import quote_html
 from config import ADMIN_ID
-from services.parser import parse_schedule_text
-from database.db import get_db
-from services.scheduler import rebuild_jobs
-from locales.strings import get_text
+from services.parser import ScheduleParser
+from database import db, runtime_settings
+from services.uploads import store_schedules, format_diff
+from services import dispatch, leader, metrics, outbox, schedule_view
 
 # --- Notify Users Function ---
-async def notify_users_about_update(bot, company, date_str, results):
-    # Знаходимо унікальні черги, які оновилися
-    updated_queues = set(r['queue'] for r in results)
-    
-    with get_db() as conn:
-        for queue in updated_queues:
-            # Знаходимо підписників цієї черги + їх мову
-            users = conn.execute('''
-                SELECT u.user_id, p.language 
-                FROM users u
-                LEFT JOIN user_prefs p ON u.user_id = p.user_id
-                WHERE u.company = ? AND u.queue = ?
-            ''', (company, queue)).fetchall()
-            
-            for user in users:
-                lang = user['language'] or 'uk'
-                text = get_text(lang, 'update_notify', company=company, queue=queue, date=date_str)
-                try:
-                    await bot.send_message(user['user_id'], text)
-                except: pass
+async def enqueue_update_notices(updated, upload_id):
+    """Ставить у outbox сповіщення для підписників оновлених черг. Повертає id пачок.
+
+    updated — множина (company, queue, date) черг, які оновилися.
+    """
+    batches = [outbox.update_batch(company, queue, date_str, upload_id) for company, queue, date_str in sorted(updated)]
+    return await outbox.enqueue(batches)
+
+async def notify_users_about_update(updated, upload_id):
+    """Ставить сповіщення в outbox і чекає доставки. Повертає лічильники."""
+    return await outbox.wait(await enqueue_update_notices(updated, upload_id))
+
+# Фонові звіти про доставку (посилання, щоб задачі не зібрав GC)
+_delivery_reports = set()
+# Скільки чекати завершення розсилки, перш ніж звітувати про незавершені черги
+REPORT_TIMEOUT = 2 * 3600
+
+async def _report_delivery(bot, chat_id, ids):
+    try:
+        stats = await outbox.wait(ids, timeout=REPORT_TIMEOUT)
+        lines = [f"📬 Доставлено: {stats['delivered']}, заблокували бота: {stats['blocked']}, помилки: {stats['failed']}"]
+        if stats['saved']:
+            lines.append(f"📦 Об'єднано в дайджести, заощаджено відправок: {stats['saved']}")
+        if stats['batches_failed']:
+            lines.append(f"❌ Розсилку не вдалося завершити для черг: {stats['batches_failed']} "
+                         f"(після {outbox.MAX_ATTEMPTS} спроб)")
+        if stats['batches_pending']:
+            lines.append(f"⏳ Не завершено за {REPORT_TIMEOUT // 60} хв, черг: {stats['batches_pending']}")
+        await bot.send_message(chat_id, "\n".join(lines))
+    except Exception as e:
+        print("Delivery report failed:", e)
 
 # --- Handlers ---
 async def cmd_tech_on(message: types.Message):
     if message.from_user.id != ADMIN_ID: return
-    with get_db() as conn:
-        conn.execute("UPDATE bot_settings SET value='1' WHERE key='tech_mode'")
-        conn.commit()
+    await runtime_settings.set_tech_mode(True)
     await message.answer("🚧 TECH MODE: ON")
 
 async def cmd_tech_off(message: types.Message):
     if message.from_user.id != ADMIN_ID: return
-    with get_db() as conn:
-        conn.execute("UPDATE bot_settings SET value='0' WHERE key='tech_mode'")
-        conn.commit()
+    await runtime_settings.set_tech_mode(False)
     await message.answer("✅ TECH MODE: OFF")
 
-async def upload_schedule(message: types.Message, scheduler):
+async def cmd_view_stats(message: types.Message):
+    if message.from_user.id != ADMIN_ID: return
+    s = schedule_view.stats()
+    await message.answer(
+        f"📊 Екран графіка: кеш {s['size']}, влучань {s['hit_rate']:.1%} ({s['hits']}/{s['hits'] + s['misses']})\n"
+        f"⏱ p50 {_ms(schedule_view.RENDER_SECONDS, 0.5)} мс, p99 {_ms(schedule_view.RENDER_SECONDS, 0.99)} мс"
+    )
+
+async def cmd_dispatch_stats(message: types.Message):
+    if message.from_user.id != ADMIN_ID: return
+    s = dispatch.stats()
+    await message.answer(
+        f"📥 Черги апдейтів: {s['queued']} у {s['chats']} чатах (макс. {s['max_chat_depth']} в одному)\n"
+        f"⏱ Очікування p50 {_ms(dispatch.WAIT_SECONDS, 0.5)} мс, p99 {_ms(dispatch.WAIT_SECONDS, 0.99)} мс\n"
+        f"Оброблено {s['processed']}, помилки {s['failed']}, об'єднано тапів {s['coalesced']}, відкинуто {s['shed']}"
+    )
+
+def _ms(histogram, q, *labels):
+    value = histogram.quantile(q, *labels)
+    return '—' if value is None else f"{value * 1000:.1f}"
+
+def _top(histogram, limit):
+    """Серії гістограми з найбільшою кількістю спостережень: рядки «мітка: p50 / p99 мс (кількість)»."""
+    series = sorted(histogram.series(), key=lambda labels: -histogram.count(*labels))[:limit]
+    return [f"  {', '.join(labels) or '—'}: {_ms(histogram, 0.5, *labels)} / {_ms(histogram, 0.99, *labels)} мс "
+            f"({histogram.count(*labels)})" for labels in series]
+
+async def cmd_stats(message: types.Message):
+    """Зведення метрик процесу (те саме, що віддає /metrics для Prometheus)."""
+    if message.from_user.id != ADMIN_ID: return
+    uptime = int(metrics.value('process_uptime_seconds'))
+    lines = [f"📈 <b>Статистика</b> — аптайм {uptime // 3600} год {uptime % 3600 // 60} хв, "
+             f"воркер {leader.WORKER_ID}{' (лідер)' if leader.is_leader() else ''}"]
+
+    lines.append("⚙️ Хендлери, p50 / p99:")
+    lines += _top(metrics.get('handler_seconds'), 5)
+
+    db_wait = metrics.get('db_queue_wait_seconds')
+    lines.append(f"🗄 БД: очікування потоку p99 {_ms(db_wait, 0.99)} мс, помилки "
+                 f"{sum(metrics.get('db_errors_total').values().values())}; найчастіші запити:")
+    lines += _top(metrics.get('db_query_seconds'), 5)
+
+    lag = metrics.get('scheduler_lag_seconds')
+    rebuild = metrics.get('scheduler_rebuild_seconds')
+    lines.append(f"⏰ Планувальник: подій {metrics.value('scheduler_jobs')}, спрацювань "
+                 f"{metrics.value('scheduler_events_fired_total')}, запізнення p50 {_ms(lag, 0.5)} / p99 {_ms(lag, 0.99)} мс, "
+                 f"rebuild p99 {_ms(rebuild, 0.99)} мс, вікно {metrics.value('scheduler_window_seconds') / 3600:.1f} год")
+
+    sent = metrics.get('broadcast_messages_total').values()
+    by_status = {}
+    for (status, reason), count in sent.items():
+        by_status[status] = by_status.get(status, 0) + count
+    reasons = ', '.join(f"{reason}: {count}" for (status, reason), count in sorted(sent.items()) if reason)
+    lines.append(f"📬 Розсилки: доставлено {by_status.get('delivered', 0)}, недосяжні {by_status.get('blocked', 0)}, "
+                 f"помилки {by_status.get('failed', 0)}{f' ({reasons})' if reasons else ''}; "
+                 f"темп останньої {metrics.value('broadcast_last_throughput')}/с, "
+                 f"заощаджено дайджестами {metrics.value('outbox_saved_total')}")
+    skew = metrics.get('outbox_delivery_skew_seconds')
+    skews = ', '.join(f"{action} {skew.quantile(0.5, action):+.1f}/{skew.quantile(0.99, action):+.1f}"
+                      for (action,) in sorted(skew.series()))
+    lines.append(f"🎯 Доставка відносно події, с (p50/p99): {skews or '—'}")
+
+    d = dispatch.stats()
+    lines.append(f"📥 Апдейти: у черзі {d['queued']}, очікування p99 {_ms(dispatch.WAIT_SECONDS, 0.99)} мс, "
+                 f"оброблено {d['processed']}, відкинуто/об'єднано тапів {d['shed']}/{d['coalesced']}")
+
+    prefs, view = db.prefs_cache.stats(), schedule_view.stats()
+    lines.append(f"💾 Кеші: налаштування {prefs['size']} ({prefs['hit_rate']:.1%}), "
+                 f"екран графіка {view['size']} ({view['hit_rate']:.1%})")
+    await message.answer('\n'.join(lines))
+
+# Скільки помилок розбору показувати адміну
+MAX_REPORTED_ERRORS = 10
+
+async def upload_schedule(message: types.Message):
     if message.from_user.id != ADMIN_ID: return
-    raw_text = message.text.replace('/upload', '').strip()
-    
-    company, date_str, data = parse_schedule_text(raw_text)
-    
-    if not company or not date_str:
+
+    if message.document:
+        if not (message.document.file_name or '').lower().endswith('.txt'):
+            return await message.answer("❌ Потрібен .txt файл з графіками")
+        buf = await message.document.download(destination_file=io.BytesIO())
+        buf.seek(0)
+        lines = io.TextIOWrapper(buf, encoding='utf-8-sig', errors='replace')
+    else:
+        lines = message.text.replace('/upload', '').strip().splitlines()
+
+    # Розбір іде ліниво прямо в транзакції запису; зберігається тільки різниця з поточним графіком
+    parser = ScheduleParser(lines)
+    diffs = await db.run(store_schedules, parser)
+
+    if not diffs:
         return await message.answer("❌ Формат: ДТЕК 29.01.2026 ...")
-    
-    with get_db() as conn:
-        # Видаляємо старі записи за цю дату і компанію
-        conn.execute("DELETE FROM schedules WHERE company = ? AND date = ?", (company, date_str))
-        for item in data:
-            conn.execute(
-                "INSERT INTO schedules (company, queue, date, off_time, on_time) VALUES (?,?,?,?,?)",
-                (item['company'], item['queue'], item['date'], item['off_time'], item['on_time'])
-            )
-        conn.commit()
-
-    await rebuild_jobs(message.bot, scheduler)
-    await notify_users_about_update(message.bot, company, date_str, data)
-    await message.answer(f"✅ {company} ({date_str}) завантажено! Сповіщення розіслані.")
-
-def register_handlers(dp: Dispatcher, scheduler):
+
+    # Перепланування та сповіщення — тільки для черг, де інтервали справді змінилися
+    changed = [(company, queue, date_str) for (company, date_str), queues in diffs.items() for queue in queues]
+    report = format_diff(diffs)
+    if changed:
+        schedule_view.invalidate(changed)
+        # Таймери переставляє лідер за журналом змін; якщо лідер — цей процес, то одразу
+        leader.notify_changed()
+        # Ключ завантаження: повторна обробка того ж повідомлення не продублює розсилку
+        ids = await enqueue_update_notices(set(changed), f"{message.chat.id}:{message.message_id}")
+        # Розсилка може тривати хвилинами — не тримаємо чергу апдейтів адміна, підсумок прийде окремим повідомленням
+        task = asyncio.create_task(_report_delivery(message.bot, message.chat.id, ids))
+        _delivery_reports.add(task)
+        task.add_done_callback(_delivery_reports.discard)
+        report.append(f"📬 Розсилка підписникам запущена (черг: {len(ids)}), підсумок надійде окремо")
+    if parser.errors:
+        report.append(f"⚠️ Нерозпізнані рядки: {len(parser.errors)}")
+        for line_no, line, reason in parser.errors[:MAX_REPORTED_ERRORS]:
+            report.append(f"  {line_no}: {reason} — {quote_html(line[:50])}")
+    await message.answer("\n".join(report))
+
+def register_handlers(dp: Dispatcher):
     dp.register_message_handler(cmd_tech_on, commands=['techon'])
     dp.register_message_handler(cmd_tech_off, commands=['techoff'])
-    dp.register_message_handler(lambda m: upload_schedule(m, scheduler), commands=['upload'])
\ No newline at end of file
+    dp.register_message_handler(cmd_view_stats, commands=['viewstats'])
+    dp.register_message_handler(cmd_dispatch_stats, commands=['dispatchstats'])
+    dp.register_message_handler(cmd_stats, commands=['stats'])
+    dp.register_message_handler(upload_schedule, commands=['upload'])
+    # Графіки можна надіслати і .txt документом
+    dp.register_message_handler(upload_schedule, lambda m: m.from_user.id == ADMIN_ID,
+                                content_types=[types.ContentType.DOCUMENT])
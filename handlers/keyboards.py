@@ -0,0 +1,163 @@
+import json
+from aiogram import types
+from aiogram.utils.callback_data import CallbackData
+import config
+from locales.strings import catalog, get_text
+
+# CallbackData
+cb_lang = CallbackData("lang", "code")
+cb_menu = CallbackData("menu", "action", "val")
+cb_sched = CallbackData("sched", "comp", "queue")
+cb_day = CallbackData("day", "comp", "queue", "date")  # date: YYYY-MM-DD
+cb_notify = CallbackData("notify", "key", "val")  # key: notify_off / notify_on / notify_off_10 / notify_on_10 ; val: current
+
+COMPANIES = ["ДТЕК", "ЦЕК"]
+QUEUES = ["1.1", "1.2", "2.1", "2.2", "3.1", "3.2", "4.1", "4.2", "5.1", "5.2", "6.1", "6.2"]
+NOTIFY_KEYS = ['notify_off', 'notify_on', 'notify_off_10', 'notify_on_10']
+# Підписи вбудованих мов; мовні пакети показуються кодом мови
+LANG_BUTTONS = {'uk': "🇺🇦 Українська", 'ru': "🇷🇺 Русский"}
+
+# Готові клавіатури: (lang, kind, variant) -> JSON-рядок.
+# Рядок — незмінний, і aiogram передає його в reply_markup як є, без повторної серіалізації.
+_cache = {}
+
+
+def _dump(kb):
+    return json.dumps(kb.to_python(), ensure_ascii=False)
+
+
+def _lang_kb():
+    kb = types.InlineKeyboardMarkup()
+    kb.add(*(types.InlineKeyboardButton(LANG_BUTTONS.get(code, code.upper()), callback_data=cb_lang.new(code=code))
+             for code in catalog.languages()))
+    return kb
+
+
+def _main_menu_kb(lang):
+    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    kb.row(get_text(lang, 'btn_add_queue'), get_text(lang, 'btn_my_queues'))
+    kb.row(get_text(lang, 'btn_schedules'))
+    kb.row(get_text(lang, 'btn_settings'), get_text(lang, 'btn_support'))
+    return kb
+
+
+def _subscribe_kb(lang):
+    return types.InlineKeyboardMarkup().add(
+        types.InlineKeyboardButton(get_text(lang, 'sub_btn'), url=config.CHANNEL_URL)
+    ).add(types.InlineKeyboardButton(get_text(lang, 'continue_btn'), callback_data="menu_start"))
+
+
+def _companies_kb(prefix):
+    return types.InlineKeyboardMarkup().add(
+        *(types.InlineKeyboardButton(comp, callback_data=f"{prefix}{comp}") for comp in COMPANIES)
+    )
+
+
+def _queues_kb(action_type, company, lang):
+    kb = types.InlineKeyboardMarkup(row_width=3)
+    btns = []
+    for q in QUEUES:
+        if action_type == 'view':
+            btns.append(types.InlineKeyboardButton(q, callback_data=cb_sched.new(comp=company, queue=q)))
+        else:
+            btns.append(types.InlineKeyboardButton(q, callback_data=cb_menu.new(action='save', val=f"{company}_{q}")))
+    kb.add(*btns)
+    back_call = "back_view" if action_type == 'view' else "back_sub"
+    kb.add(types.InlineKeyboardButton(get_text(lang, 'back'), callback_data=back_call))
+    return kb
+
+
+def schedule_nav(lang, company, queue, prev_date, next_date):
+    """Навігація по днях для екрана графіка (кешується разом з текстом у services.schedule_view)."""
+    kb = types.InlineKeyboardMarkup()
+    row = []
+    if prev_date:
+        row.append(types.InlineKeyboardButton(f"⬅️ {prev_date[8:10]}.{prev_date[5:7]}",
+                                              callback_data=cb_day.new(comp=company, queue=queue, date=prev_date)))
+    if next_date:
+        row.append(types.InlineKeyboardButton(f"{next_date[8:10]}.{next_date[5:7]} ➡️",
+                                              callback_data=cb_day.new(comp=company, queue=queue, date=next_date)))
+    if row:
+        kb.row(*row)
+    kb.add(types.InlineKeyboardButton(get_text(lang, 'back'), callback_data=f"vcomp_{company}"))
+    return _dump(kb)
+
+
+def _settings_kb(lang):
+    kb = types.InlineKeyboardMarkup(row_width=1)
+    kb.add(types.InlineKeyboardButton(get_text(lang, 'btn_lang_switch'), callback_data="open_lang"))
+    kb.add(types.InlineKeyboardButton(get_text(lang, 'btn_notifications'), callback_data="open_notifications"))
+    kb.add(types.InlineKeyboardButton(get_text(lang, 'btn_toggle_all'), callback_data="toggle_all"))
+    return kb
+
+
+def _notifications_kb(lang, states):
+    """states — рядок з чотирьох 0/1 у порядку NOTIFY_KEYS."""
+    kb = types.InlineKeyboardMarkup(row_width=1)
+    for key, state in zip(NOTIFY_KEYS, states):
+        label = get_text(lang, 'notif_label_' + key[len('notify_'):])
+        kb.add(types.InlineKeyboardButton(f"{label}: {'✅' if state == '1' else '❌'}",
+                                          callback_data=cb_notify.new(key=key, val=state)))
+    kb.add(types.InlineKeyboardButton(get_text(lang, 'back'), callback_data="open_settings_back"))
+    return kb
+
+
+_shared = {}
+_built = set()
+_labels = {}
+
+
+def _build_lang(lang):
+    _built.add(lang)
+    for kind, markup in _shared.items():
+        _cache[(lang, kind, None)] = markup
+    _cache[(lang, 'main_menu', None)] = _dump(_main_menu_kb(lang))
+    _cache[(lang, 'subscribe', None)] = _dump(_subscribe_kb(lang))
+    _cache[(lang, 'settings', None)] = _dump(_settings_kb(lang))
+    for comp in COMPANIES:
+        _cache[(lang, 'queues_view', comp)] = _dump(_queues_kb('view', comp, lang))
+        _cache[(lang, 'queues_save', comp)] = _dump(_queues_kb('save', comp, lang))
+    for mask in range(16):
+        states = format(mask, '04b')
+        _cache[(lang, 'notifications', states)] = _dump(_notifications_kb(lang, states))
+
+
+def build():
+    """Будує клавіатури для вбудованих мов (один раз при старті); мовні пакети — при першому зверненні."""
+    _cache.clear()
+    _built.clear()
+    _labels.clear()
+    _shared.update({
+        'lang': _dump(_lang_kb()),
+        'companies_view': _dump(_companies_kb("vcomp_")),
+        'companies_save': _dump(_companies_kb("scomp_")),
+    })
+    for lang in catalog.builtin:
+        _build_lang(lang)
+
+
+def get(kind, lang='uk', variant=None):
+    """Готова клавіатура (JSON-рядок для reply_markup); None, якщо такої немає."""
+    markup = _cache.get((lang, kind, variant))
+    if markup is None:
+        if lang not in _built and catalog.has_language(lang):
+            _build_lang(lang)
+            markup = _cache.get((lang, kind, variant))
+        if markup is None:
+            # Невідома мова — як get_text, падаємо на мову за замовчуванням
+            markup = _cache.get((catalog.default, kind, variant))
+    return markup
+
+
+def notifications(lang, settings):
+    states = ''.join('1' if int(settings[key]) == 1 else '0' for key in NOTIFY_KEYS)
+    return get('notifications', lang, states)
+
+
+def labels(key):
+    """Підписи кнопки key у всіх завантажених мовах (для фільтрів текстових кнопок)."""
+    loaded = catalog.loaded()
+    cached = _labels.get(key)
+    if cached is None or cached[0] != len(loaded):
+        cached = _labels[key] = (len(loaded), frozenset(get_text(lang, key) for lang in loaded))
+    return cached[1]
@@ -0,0 +1,93 @@
+import json
+import os
+import re
+from string import Formatter
+
+# Код мови з callback_data/БД потрапляє в шлях до файлу — пропускаємо лише безпечні
+LANG_CODE_RE = re.compile(r'^[a-z]{2,3}(?:[-_][A-Za-z]{2,4})?$')
+
+
+def _fields(template):
+    return frozenset(name for _, name, _, _ in Formatter().parse(template) if name is not None)
+
+
+class Catalog:
+    """Скомпільований каталог текстів.
+
+    Шаблони перевіряються й готуються один раз: текст без плейсхолдерів зберігається вже готовим,
+    для решти — зв'язаний str.format. Плейсхолдери кожної мови мають збігатися з мовою за замовчуванням.
+    Додаткові мови лежать у packs_dir/<lang>.json і читаються лише при першому зверненні.
+    """
+
+    def __init__(self, builtin, packs_dir, default='uk'):
+        self.default = default
+        self.packs_dir = packs_dir
+        self.builtin = tuple(builtin)
+        self._fields = {key: _fields(text) for key, text in builtin[default].items()}
+        self._langs = {}
+        # Мови, для яких файлу немає (щоб не перевіряти диск на кожен виклик)
+        self._missing = set()
+        for lang, texts in builtin.items():
+            compiled, errors = self._compile(texts)
+            if errors:
+                raise ValueError(f"Locale '{lang}': " + "; ".join(errors))
+            self._langs[lang] = compiled
+
+    def _compile(self, texts):
+        compiled = {}
+        errors = []
+        for key, template in texts.items():
+            try:
+                fields = _fields(template)
+            except (ValueError, AttributeError) as e:
+                errors.append(f"{key}: {e}")
+                continue
+            if key in self._fields and fields != self._fields[key]:
+                errors.append(f"{key}: плейсхолдери {sorted(fields)} замість {sorted(self._fields[key])}")
+                continue
+            compiled[key] = (True, template.format()) if not fields else (False, template.format)
+        return compiled, errors
+
+    def _load(self, lang):
+        """Підвантажує мовний пакет; якщо його немає — повертає None."""
+        if lang in self._missing or not LANG_CODE_RE.match(lang or ''):
+            return None
+        path = os.path.join(self.packs_dir, f"{lang}.json")
+        try:
+            with open(path, encoding='utf-8') as f:
+                texts = json.load(f)
+        except FileNotFoundError:
+            self._missing.add(lang)
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Locale pack {path} is broken:", e)
+            self._missing.add(lang)
+            return None
+        compiled, errors = self._compile(texts)
+        for error in errors:
+            # Зламаний рядок пакета замінюється текстом мови за замовчуванням
+            print(f"Locale pack {lang}: {error}")
+        self._langs[lang] = compiled
+        return compiled
+
+    def has_language(self, lang):
+        return lang in self._langs or self._load(lang) is not None
+
+    def languages(self):
+        """Вбудовані мови та доступні пакети (файли не читаються)."""
+        packs = []
+        if os.path.isdir(self.packs_dir):
+            packs = sorted(name[:-5] for name in os.listdir(self.packs_dir)
+                           if name.endswith('.json') and LANG_CODE_RE.match(name[:-5]))
+        return list(self.builtin) + [lang for lang in packs if lang not in self.builtin]
+
+    def loaded(self):
+        return list(self._langs)
+
+    def get_text(self, lang_code, key, **kwargs):
+        texts = self._langs.get(lang_code) or self._load(lang_code) or self._langs[self.default]
+        entry = texts.get(key) or self._langs[self.default].get(key)
+        if entry is None:
+            return key
+        static, value = entry
+        return value if static else value(**kwargs)
@@ -1,3 +1,6 @@
+import os
+from locales.catalog import Catalog
+
 TEXTS = {
     'uk': {
         'select_lang': "🇺🇦 Будь ласка, оберіть мову:",
@@ -15,6 +18,7 @@ TEXTS = {
         'choose_queue': "📍 Оберіть чергу для <b>{company}</b>:",
         'schedule_view': "📅 <b>Графік {company} {queue} на {date}:</b>\n\n{schedule}\n\n<i>Оновлено: {updated}</i>",
         'no_schedule': "📭 На жаль, графік для цієї черги на обрану дату ще не завантажено.",
+        'schedule_empty': "📅 <b>Графік {company} {queue} на {date}:</b>\n\n📭 Графік на цю дату ще не завантажено.",
         'back': "⬅️ Назад",
         'limit_error': "🚫 Максимум 5 черг! Видаліть щось.",
         'added': "✅ Підписано: {company} {queue}",
@@ -24,6 +28,8 @@ TEXTS = {
         'support_text': "🛠 <b>Підтримка:</b> {user}\n☕ <b>Донат:</b> {url}\n📢 <b>Наш канал (FAQ, тех. підтримка)</b>: https://t.me/lightmetech",
         'tech_work': "🚧 <b>Технічні роботи</b>\nБот тимчасово недоступний. Спробуйте пізніше.\nСлідкуйте за новинами бота на нашому каналі @lightmetech",
         'update_notify': "🔔 <b>Оновлення графіку!</b>\nЗавантажено новий графік для {company} {queue} на {date}.",
+        'update_digest': "🔔 <b>Оновлення графіків!</b>\nЗавантажено нові графіки:",
+        'update_digest_item': "• {company} {queue} на {date}",
         'settings_text': "⚙️ Налаштування:",
         'btn_lang_switch': "🇺🇦/🇷🇺 Змінити мову",
         'reminder_off': "🔔 Нагадування: очікуване вимкнення світла в черзі {company} {queue} через 10 хв.",
@@ -55,6 +61,7 @@ TEXTS = {
         'choose_queue': "📍 Выберите очередь для <b>{company}</b>:",
         'schedule_view': "📅 <b>График {company} {queue} на {date}:</b>\n\n{schedule}\n\n<i>Обновлено: {updated}</i>",
         'no_schedule': "📭 К сожалению, график для этой очереди на выбранную дату еще не загружен.",
+        'schedule_empty': "📅 <b>График {company} {queue} на {date}:</b>\n\n📭 График на эту дату еще не загружен.",
         'back': "⬅️ Назад",
         'limit_error': "🚫 Максимум 5 очередей! Удалите что-то.",
         'added': "✅ Подписано: {company} {queue}",
@@ -64,6 +71,8 @@ TEXTS = {
         'support_text': "🛠 <b>Поддержка:</b> {user}\n☕ <b>Донат:</b> {url}",
         'tech_work': "🚧 <b>Технические работы</b>\nБот временно недоступен. Попробуйте позже.\nСледите за обновлениями бота на нашем канале @lightmetech",
         'update_notify': "🔔 <b>Обновление графика!</b>\nЗагружен новый график для {company} {queue} на {date}.",
+        'update_digest': "🔔 <b>Обновление графиков!</b>\nЗагружены новые графики:",
+        'update_digest_item': "• {company} {queue} на {date}",
         'settings_text': "⚙️ Настройки:",
         'btn_lang_switch': "🇺🇦/🇷🇺 Сменить язык",
         'reminder_off': "🔔 Напоминание: ожидаемое отключение света в очереди {company} {queue} через 10 минут.",
@@ -82,11 +91,7 @@ TEXTS = {
     }
 }
 
-def get_text(lang_code, key, **kwargs):
-    lang = lang_code if lang_code in TEXTS else 'uk'
-
-    return TEXTS[lang].get(key, key).format(**kwargs)
-
-
-
+# Каталог компілюється один раз при імпорті; додаткові мови — locales/packs/<lang>.json
+catalog = Catalog(TEXTS, os.path.join(os.path.dirname(__file__), 'packs'))
 
+get_text = catalog.get_text
@@ -14,35 +14,77 @@ try:
 except ImportError:
     pass
 
+import asyncio
 from aiogram import Bot, Dispatcher, types
+from aiogram.bot.api import TELEGRAM_PRODUCTION, TelegramAPIServer
 from aiogram.utils import executor
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 import config
+from database import db
 from database.db import init_db
-from services.scheduler import rebuild_jobs
+from database import runtime_settings
+from services.scheduler import fire_events, horizon
+from services.timeline import Timeline
+from services import dispatch, leader, metrics, schedule_view, webhook
 from handlers import client, admin
+from middlewares.metrics import MetricsMiddleware
 from middlewares.tech_work import TechWorkMiddleware
 
 # Ініціалізація
-bot = Bot(token=config.API_TOKEN, parse_mode=types.ParseMode.HTML)
-dp = Dispatcher(bot)
-scheduler = AsyncIOScheduler()
+api_server = TelegramAPIServer.from_base(config.TELEGRAM_API_SERVER) if config.TELEGRAM_API_SERVER else TELEGRAM_PRODUCTION
+bot = Bot(token=config.API_TOKEN, parse_mode=types.ParseMode.HTML, server=api_server)
+# 'ordered': апдейти одного чату по черзі (не губляться швидкі повторні натискання), різних — паралельно
+dp = dispatch.OrderedDispatcher(bot) if config.DISPATCH_MODE == 'ordered' else Dispatcher(bot)
+timeline = Timeline(fire_events)
 
-# Middlewares
+# Middlewares (метрики — першими, щоб вимірювати й решту)
+dp.middleware.setup(MetricsMiddleware())
 dp.middleware.setup(TechWorkMiddleware())
 
+# Метрики, що читаються під час збору
+metrics.callback('scheduler_jobs', 'Події в timeline цього воркера', lambda: len(timeline))
+metrics.callback('scheduler_window_seconds', 'На скільки секунд уперед завантажено події',
+                 lambda: max(int(horizon() - time.time()), 0) if leader.is_leader() else 0)
+metrics.callback('scheduler_leader', 'Чи є воркер лідером', lambda: int(leader.is_leader()))
+_caches = {'prefs': lambda: db.prefs_cache.stats(), 'schedule_view': schedule_view.stats}
+metrics.callback('cache_entries', 'Записів у кеші',
+                 lambda: {(name,): stats()['size'] for name, stats in _caches.items()}, labels=('cache',))
+metrics.callback('cache_hits_total', 'Влучання в кеш',
+                 lambda: {(name,): stats()['hits'] for name, stats in _caches.items()}, labels=('cache',), kind='counter')
+metrics.callback('cache_misses_total', 'Промахи кешу',
+                 lambda: {(name,): stats()['misses'] for name, stats in _caches.items()}, labels=('cache',), kind='counter')
+
 # Реєстрація хендлерів
-admin.register_handlers(dp, scheduler)
+admin.register_handlers(dp)
 client.register_handlers(dp)
 
 async def on_startup(dispatcher):
     print("🚀 System initializing...")
-    init_db()
-    await rebuild_jobs(bot, scheduler)
-    scheduler.start()
-    print("✅ Bot is ready & Scheduler started!")
+    await init_db()
+    await runtime_settings.load()
+    asyncio.create_task(runtime_settings.watch())
+    # Таймери графіка й розсилки веде лише воркер-лідер; решта тільки обробляє апдейти
+    leader.start(bot, timeline)
+    if config.RUN_MODE == 'webhook':
+        await webhook.register(bot)
+    if config.METRICS_PORT:
+        await metrics.serve(config.METRICS_HOST, config.METRICS_PORT)
+    print(f"✅ Bot is ready! Worker {leader.WORKER_ID}")
+
+async def on_shutdown(dispatcher):
+    # Сервер уже не приймає запити — доробляємо прийняті апдейти
+    await webhook.drain(config.WEBHOOK_DRAIN_TIMEOUT)
+    await dispatch.drain(config.WEBHOOK_DRAIN_TIMEOUT)
+    # Спочатку зупиняє доставки outbox, потім віддає аренду — новий лідер не дублює розсилку
+    await leader.release()
+    timeline.stop()
+    await metrics.stop()
 
 if __name__ == '__main__':
-    executor.start_polling(dp, on_startup=on_startup, skip_updates=True)
+    if config.RUN_MODE == 'webhook':
+        executor.set_webhook(
+            dp, None, web_app=webhook.setup(), on_startup=on_startup, on_shutdown=on_shutdown
+        ).run_app(host=config.WEBAPP_HOST, port=config.WEBAPP_PORT)
+    else:
+        executor.start_polling(dp, on_startup=on_startup, skip_updates=True)
 
@@ -0,0 +1,50 @@
+import time
+from aiogram import types
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from services import metrics
+
+UPDATE_SECONDS = metrics.histogram('update_seconds', 'Повна обробка апдейта', labels=('type',))
+HANDLER_SECONDS = metrics.histogram('handler_seconds', 'Час роботи хендлера', labels=('handler',))
+
+UPDATE_TYPES = ('message', 'callback_query', 'edited_message', 'my_chat_member', 'inline_query')
+
+
+def _update_type(update: types.Update):
+    for kind in UPDATE_TYPES:
+        if getattr(update, kind) is not None:
+            return kind
+    return 'other'
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Латентність апдейтів і хендлерів (метрики update_seconds, handler_seconds)."""
+
+    async def on_pre_process_update(self, update: types.Update, data: dict):
+        data['_metrics_started'] = time.perf_counter()
+
+    async def on_post_process_update(self, update: types.Update, results, data: dict):
+        UPDATE_SECONDS.observe(time.perf_counter() - data['_metrics_started'], _update_type(update))
+
+    def _start(self, data):
+        handler = current_handler.get(None)
+        data['_metrics_handler'] = (getattr(handler, '__name__', 'unknown'), time.perf_counter())
+
+    def _finish(self, data):
+        # Апдейт без відповідного хендлера сюди теж потрапляє — його не рахуємо
+        started = data.get('_metrics_handler')
+        if started:
+            name, start = started
+            HANDLER_SECONDS.observe(time.perf_counter() - start, name)
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        self._start(data)
+
+    async def on_post_process_message(self, message: types.Message, results, data: dict):
+        self._finish(data)
+
+    async def on_process_callback_query(self, call: types.CallbackQuery, data: dict):
+        self._start(data)
+
+    async def on_post_process_callback_query(self, call: types.CallbackQuery, results, data: dict):
+        self._finish(data)
@@ -0,0 +1,215 @@
+import asyncio
+import heapq
+import itertools
+import time
+from aiogram.utils.exceptions import (
+    BadRequest, BotBlocked, BotKicked, CantInitiateConversation, ChatNotFound,
+    RetryAfter, Unauthorized, UserDeactivated,
+)
+from services import metrics
+
+# Ліміти Telegram: ~30 повідомлень/с на бота і ~1 повідомлення/с в один чат
+GLOBAL_RATE = 30
+PER_CHAT_INTERVAL = 1.0
+MAX_CONCURRENCY = 25
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 0.5
+# Пріоритет відправки: менше — раніше отримує токен (див. outbox.ACTION_PRIORITY)
+DEFAULT_PRIORITY = 1
+# Швидкість розсилки оцінюється лише за досить великими розсилками
+RATE_SAMPLE_MIN = 50
+
+# Отримувач недосяжний назавжди — повторювати немає сенсу; значення — причина, яка зберігається в БД
+UNREACHABLE = {
+    BotBlocked: 'blocked',
+    BotKicked: 'kicked',
+    UserDeactivated: 'deactivated',
+    ChatNotFound: 'chat_not_found',
+    CantInitiateConversation: 'cant_initiate',
+}
+BLOCKED_ERRORS = tuple(UNREACHABLE)
+
+
+class TokenBucket:
+    """Глобальний token bucket, спільний для всіх розсилок процесу.
+
+    Черга за токенами — за пріоритетом (потім за часом приходу): термінові повідомлення
+    однієї розсилки обганяють менш термінові інших, що йдуть паралельно.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._busy = False
+        self._waiters = []
+        self._seq = itertools.count()
+
+    def pause(self, seconds):
+        """Зупиняє всі відправки (після RetryAfter від Telegram)."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    async def _turn(self, priority):
+        if not self._busy and not self._waiters:
+            self._busy = True
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Черга вже дійшла, але задачу скасували — передаємо далі
+                self._next()
+            raise
+
+    def _next(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._busy = False
+
+    async def acquire(self, priority=DEFAULT_PRIORITY):
+        await self._turn(priority)
+        try:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+        finally:
+            self._next()
+
+
+MESSAGES = metrics.counter('broadcast_messages_total', 'Результати відправок', labels=('status', 'reason'))
+SEND_SECONDS = metrics.histogram('broadcast_send_seconds', 'Відправка одного повідомлення з лімітами й повторами',
+                                 labels=('status',))
+RETRIES = metrics.counter('broadcast_retries_total', 'Повторні спроби відправки', labels=('cause',))
+THROUGHPUT = metrics.gauge('broadcast_last_throughput', 'Повідомлень за секунду в останній розсилці')
+
+bucket = TokenBucket(GLOBAL_RATE)
+_chat_last_send = {}
+# Спостережена швидкість великих розсилок (згладжена), повідомлень/с
+_observed_rate = None
+
+
+def estimate_seconds(count):
+    """Скільки триватиме розсилка count повідомлень: за спостереженою швидкістю, але не швидше за ліміт."""
+    rate = bucket.rate if _observed_rate is None else min(_observed_rate, bucket.rate)
+    return count / rate
+
+
+def _observe_rate(rate):
+    global _observed_rate
+    _observed_rate = rate if _observed_rate is None else 0.7 * _observed_rate + 0.3 * rate
+
+
+async def _wait_chat_slot(chat_id):
+    """Не частіше PER_CHAT_INTERVAL секунд в один чат."""
+    now = time.monotonic()
+    wait = _chat_last_send.get(chat_id, 0) + PER_CHAT_INTERVAL - now
+    _chat_last_send[chat_id] = now + max(wait, 0)
+    if wait > 0:
+        await asyncio.sleep(wait)
+    if len(_chat_last_send) > 50000:
+        # Прибираємо старі записи, щоб словник не ріс безмежно
+        cutoff = time.monotonic() - PER_CHAT_INTERVAL
+        for cid in [c for c, t in _chat_last_send.items() if t < cutoff]:
+            del _chat_last_send[cid]
+
+
+def _unreachable_reason(error):
+    for error_type, reason in UNREACHABLE.items():
+        if isinstance(error, error_type):
+            return reason
+
+
+async def _send(bot, chat_id, text, kwargs, priority=DEFAULT_PRIORITY):
+    """Одна відправка з повторами. Повертає (статус, причина): причина — для 'blocked' (див. UNREACHABLE)
+    і для 'failed' ('rejected' — Telegram відхилив запит, 'transient' — тимчасові збої не минули)."""
+    start = time.perf_counter()
+    status, reason = await _attempts(bot, chat_id, text, kwargs, priority)
+    SEND_SECONDS.observe(time.perf_counter() - start, status)
+    MESSAGES.inc(status, reason or '')
+    return status, reason
+
+
+async def _attempts(bot, chat_id, text, kwargs, priority):
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        await _wait_chat_slot(chat_id)
+        await bucket.acquire(priority)
+        try:
+            await bot.send_message(chat_id, text, **kwargs)
+            return 'delivered', None
+        except RetryAfter as e:
+            print(f"Flood control: пауза {e.timeout} с")
+            RETRIES.inc('flood')
+            bucket.pause(e.timeout)
+        except BLOCKED_ERRORS as e:
+            return 'blocked', _unreachable_reason(e)
+        except (BadRequest, Unauthorized) as e:
+            print(f"Помилка відправки {chat_id}: {e}")
+            return 'failed', 'rejected'
+        except Exception as e:
+            # NetworkError, RestartingTelegram, таймаути — тимчасові збої, повторюємо з backoff
+            print(f"Тимчасова помилка відправки {chat_id} (спроба {attempt}): {e}")
+            RETRIES.inc('transient')
+            await asyncio.sleep(BACKOFF_BASE * 2 ** (attempt - 1))
+    return 'failed', 'transient'
+
+
+async def broadcast(bot, messages, on_result=None, on_unreachable=None, priority=DEFAULT_PRIORITY, **kwargs):
+    """Розсилає (chat_id, text) з обмеженою паралельністю. Повертає лічильники результатів.
+
+    priority — черговість у спільному ліміті відправок (менше — раніше).
+    on_result — корутина (chat_id, status), що викликається після кожного повідомлення.
+    Якщо повідомлення задане як (chat_id, text, meta), meta передається третім аргументом.
+    on_unreachable — корутина (chat_id, reason) для отримувачів, недосяжних назавжди.
+    """
+    stats = {'delivered': 0, 'failed': 0, 'blocked': 0}
+    # Розбивка недоставлених за причинами (для логів)
+    reasons = {}
+    messages = iter(messages)
+    started = time.perf_counter()
+
+    async def worker():
+        for chat_id, text, *meta in messages:
+            status, reason = await _send(bot, chat_id, text, kwargs, priority)
+            stats[status] += 1
+            if reason:
+                reasons[reason] = reasons.get(reason, 0) + 1
+            if status == 'blocked' and on_unreachable:
+                await on_unreachable(chat_id, reason)
+            if on_result:
+                await on_result(chat_id, status, *meta)
+
+    workers = [asyncio.create_task(worker()) for _ in range(MAX_CONCURRENCY)]
+    try:
+        await asyncio.gather(*workers)
+    except BaseException:
+        # Помилка в одному воркері (наприклад, в on_result) зупиняє всю розсилку: інакше решта
+        # продовжила б відправки, які outbox уже не зафіксує й повторить
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        raise
+    sent = sum(stats.values())
+    if sent:
+        rate = sent / (time.perf_counter() - started)
+        THROUGHPUT.set(round(rate, 2))
+        if sent >= RATE_SAMPLE_MIN:
+            _observe_rate(rate)
+    if reasons:
+        stats['reasons'] = reasons
+    return stats
@@ -0,0 +1,222 @@
+import asyncio
+import time
+from collections import deque
+import aiohttp
+from aiohttp.helpers import sentinel
+from aiogram import Bot, Dispatcher
+import config
+from services import metrics
+
+# Черги апдейтів по чатах: chat_id -> deque[(update, час постановки, future)].
+# Для кожного непорожнього чату працює одна задача, тож апдейти чату обробляються по черзі
+_queues = {}
+# Скільки апдейтів чекає в усіх чергах (для backpressure)
+_depth = 0
+_space = asyncio.Event()
+# Обмеження одночасної обробки апдейтів різних чатів
+_slots = asyncio.Semaphore(config.DISPATCH_MAX_CONCURRENCY)
+# Незавершені апдейти (для drain при зупинці)
+_pending = set()
+_counters = {'processed': 0, 'failed': 0, 'coalesced': 0, 'shed': 0}
+
+WAIT_SECONDS = metrics.histogram('dispatch_wait_seconds', 'Від постановки апдейта в чергу до початку обробки')
+metrics.callback('dispatch_queue_depth', 'Апдейти, що чекають у чергах', lambda: _depth)
+metrics.callback('dispatch_active_chats', 'Чати з необробленими апдейтами', lambda: len(_queues))
+metrics.callback('dispatch_updates_total', 'Апдейти за результатом',
+                 lambda: {(key,): value for key, value in _counters.items()}, labels=('result',), kind='counter')
+
+
+class OrderedDispatcher(Dispatcher):
+    """Dispatcher, що обробляє апдейти одного чату по порядку, а різних чатів — паралельно
+    (не більше DISPATCH_MAX_CONCURRENCY одночасно).
+
+    process_updates лише ставить апдейти в черги й чекає, тільки поки черги переповнені.
+    """
+
+    async def process_updates(self, updates, fast: bool = True):
+        for update in updates:
+            await submit(self, update)
+        return []
+
+    async def start_polling(self, timeout=20, relax=0.1, limit=None, reset_webhook=None, fast: bool = True,
+                            error_sleep: int = 5, allowed_updates=None):
+        """Long polling з backpressure: як в aiogram, але пачка ставиться в черги в самому циклі опитування.
+
+        Поки в чергах DISPATCH_MAX_QUEUE апдейтів, getUpdates не викликається і offset не зсувається —
+        непрочитані апдейти лишаються в Telegram, а не у фонових задачах у пам'яті.
+        """
+        if self._polling:
+            raise RuntimeError('Polling already started')
+        Dispatcher.set_current(self)
+        Bot.set_current(self.bot)
+        if reset_webhook is None:
+            await self.reset_webhook(check=False)
+        if reset_webhook:
+            await self.reset_webhook(check=True)
+
+        self._polling = True
+        offset = None
+        try:
+            request_timeout = None
+            if self.bot.timeout is not sentinel and timeout is not None:
+                request_timeout = aiohttp.ClientTimeout(total=self.bot.timeout.total + timeout or 1)
+            while self._polling:
+                await wait_space()
+                try:
+                    with self.bot.request_timeout(request_timeout):
+                        updates = await self.bot.get_updates(limit=limit, offset=offset, timeout=timeout,
+                                                             allowed_updates=allowed_updates)
+                except asyncio.CancelledError:
+                    break
+                except Exception as e:
+                    print("Polling error:", e)
+                    await asyncio.sleep(error_sleep)
+                    continue
+                if updates:
+                    await self.process_updates(updates, fast)
+                    offset = updates[-1].update_id + 1
+                if relax:
+                    await asyncio.sleep(relax)
+        finally:
+            self._close_waiter.set_result(None)
+
+
+def _chat_id(update):
+    if update.message:
+        return update.message.chat.id
+    if update.callback_query:
+        call = update.callback_query
+        return call.message.chat.id if call.message else call.from_user.id
+    if update.edited_message:
+        return update.edited_message.chat.id
+    if update.my_chat_member:
+        return update.my_chat_member.chat.id
+    return None
+
+
+def _same_tap(a, b):
+    """Повторне натискання тієї ж кнопки на тому ж повідомленні."""
+    return (a.data == b.data and a.message is not None and b.message is not None
+            and a.message.message_id == b.message.message_id)
+
+
+async def _answer(bot, call):
+    # Відкинутий тап теж треба підтвердити, інакше в клієнта крутиться годинник
+    try:
+        await bot.answer_callback_query(call.id)
+    except Exception:
+        pass
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+    _pending.discard(future)
+
+
+def _shed_tap(dispatcher, queue, update, future):
+    """Застосовує DISPATCH_CALLBACK_POLICY до нового тапу. Повертає True, якщо окремо в чергу він не ставиться.
+
+    coalesce — повтор тапу, що ще чекає в черзі, замінює його (лишається найсвіжіший);
+    shed — повтор відкидається. В обох режимах тапи відкидаються, якщо в черзі чату
+    вже DISPATCH_PER_CHAT_LIMIT апдейтів.
+    """
+    call = update.callback_query
+    for i, (queued, enqueued, queued_future) in enumerate(queue):
+        if queued.callback_query and _same_tap(queued.callback_query, call):
+            if config.DISPATCH_CALLBACK_POLICY == 'coalesce':
+                # Місце в черзі те саме — порядок апдейтів чату не змінюється
+                queue[i] = (update, enqueued, future)
+                call, future = queued.callback_query, queued_future
+                _counters['coalesced'] += 1
+            else:
+                _counters['shed'] += 1
+            break
+    else:
+        if len(queue) < config.DISPATCH_PER_CHAT_LIMIT:
+            return False
+        _counters['shed'] += 1
+    asyncio.create_task(_answer(dispatcher.bot, call))
+    _resolve(future)
+    return True
+
+
+async def wait_space():
+    """Чекає, поки в чергах стане менше DISPATCH_MAX_QUEUE апдейтів."""
+    while _depth >= config.DISPATCH_MAX_QUEUE:
+        _space.clear()
+        await _space.wait()
+
+
+async def submit(dispatcher, update):
+    """Ставить апдейт у чергу його чату. Повертає future, що завершиться після обробки.
+
+    Якщо в чергах уже DISPATCH_MAX_QUEUE апдейтів, чекає на місце (backpressure:
+    у режимі вебхука Telegram отримує відповідь пізніше, у polling — не запитуються нові апдейти).
+    """
+    global _depth
+    future = asyncio.get_running_loop().create_future()
+    _pending.add(future)
+    # Апдейти без чату (inline-запити тощо) не впорядковуються
+    chat_id = _chat_id(update)
+    key = chat_id if chat_id is not None else ('update', update.update_id)
+
+    queue = _queues.get(key)
+    if (update.callback_query and queue and config.DISPATCH_CALLBACK_POLICY != 'none'
+            and _shed_tap(dispatcher, queue, update, future)):
+        return future
+
+    await wait_space()
+
+    queue = _queues.get(key)
+    if queue is None:
+        queue = _queues[key] = deque()
+        asyncio.create_task(_run_chat(dispatcher, key, queue))
+    queue.append((update, time.monotonic(), future))
+    _depth += 1
+    return future
+
+
+async def _run_chat(dispatcher, key, queue):
+    global _depth
+    # Задача може бути створена поза контекстом aiogram (наприклад, з обробника вебхука)
+    Bot.set_current(dispatcher.bot)
+    Dispatcher.set_current(dispatcher)
+    try:
+        while queue:
+            async with _slots:
+                update, enqueued, future = queue.popleft()
+                _depth -= 1
+                if _depth < config.DISPATCH_MAX_QUEUE:
+                    _space.set()
+                waited = time.monotonic() - enqueued
+                WAIT_SECONDS.observe(waited)
+                try:
+                    await dispatcher.updates_handler.notify(update)
+                    _counters['processed'] += 1
+                except Exception as e:
+                    _counters['failed'] += 1
+                    print(f"Update {update.update_id} failed:", e)
+                finally:
+                    _resolve(future)
+    finally:
+        # Між перевіркою черги й видаленням немає await — новий апдейт не загубиться
+        _queues.pop(key, None)
+
+
+async def drain(timeout):
+    """Чекає завершення апдейтів у чергах і в обробці (при зупинці)."""
+    if _pending:
+        print(f"Dispatch: очікування {len(_pending)} апдейтів...")
+        _, pending = await asyncio.wait(set(_pending), timeout=timeout)
+        if pending:
+            print(f"Dispatch: не завершено за {timeout} с — {len(pending)}")
+
+
+def stats():
+    """Глибина черг і лічильники (очікування до початку обробки — в WAIT_SECONDS)."""
+    result = dict(_counters)
+    result['queued'] = _depth
+    result['chats'] = len(_queues)
+    result['max_chat_depth'] = max((len(q) for q in _queues.values()), default=0)
+    return result
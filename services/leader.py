@@ -0,0 +1,149 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from database import changes, db
+from services import outbox, schedule_view
+from services.scheduler import rebuild_jobs, refill_jobs, reschedule_slices
+
+# Несколько воркеров (в режиме вебхука) обрабатывают апдейты все вместе, а таймеры графика
+# и доставку outbox ведёт только один — владелец аренды в таблице leases.
+LEASE_NAME = 'scheduler'
+# Срок аренды: если лидер не продлил её за это время, роль забирает другой воркер
+LEASE_TTL = 15
+HEARTBEAT = 5
+# Как часто читать журнал изменений, если никто не разбудил раньше
+CHANGES_POLL = 2
+# Сколько хранить записи журнала (новые воркеры читают только с текущего конца)
+CHANGES_RETENTION = 3600
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+_is_leader = False
+_changed = asyncio.Event()
+# Цикл доставки outbox (работает только у лидера)
+_worker = None
+# Фоновая задача run() этого воркера
+_task = None
+
+
+def is_leader():
+    return _is_leader
+
+
+def notify_changed():
+    """Будит чтение журнала сразу (изменение сделано в этом процессе)."""
+    _changed.set()
+
+
+def _acquire(conn, owner, now):
+    # Одна UPSERT-команда: продлить свою аренду или забрать просроченную чужую
+    cur = conn.execute(
+        "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+        "WHERE leases.owner = excluded.owner OR leases.expires_at < ?",
+        (LEASE_NAME, owner, now + LEASE_TTL, now)
+    )
+    return cur.rowcount == 1
+
+
+def _release(conn, owner):
+    conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (LEASE_NAME, owner))
+
+
+async def _apply_changes(rows, timeline):
+    slices = set()
+    wake_outbox = False
+    for row in rows:
+        if row['kind'] == changes.PREFS:
+            db.prefs_cache.invalidate(row['user_id'])
+        elif row['kind'] == changes.SCHEDULE:
+            slices.add((row['company'], row['queue'], row['date']))
+        elif row['kind'] == changes.OUTBOX:
+            wake_outbox = True
+    # Экраны графика кэшируются на каждом воркере
+    schedule_view.invalidate(slices)
+    if not _is_leader:
+        return
+    if slices:
+        await reschedule_slices(timeline, slices)
+    if wake_outbox:
+        outbox.wake()
+
+
+async def _stop_delivery():
+    """Останавливает цикл outbox и уже начатые им доставки — до того, как аренду получит другой воркер."""
+    global _worker
+    if _worker is not None:
+        _worker.cancel()
+        _worker = None
+    await outbox.stop()
+
+
+async def run(bot, timeline):
+    """Фоновая задача каждого воркера: выборы лидера и применение журнала изменений."""
+    global _is_leader, _worker
+    last_seq = await db.run(changes.last_seq)
+    next_heartbeat = 0
+    last_cleanup = 0
+    while True:
+        _changed.clear()
+        try:
+            now = time.time()
+            if now >= next_heartbeat:
+                next_heartbeat = now + HEARTBEAT
+                leading = await db.run(_acquire, WORKER_ID, int(now))
+                if leading and not _is_leader:
+                    await rebuild_jobs(timeline)
+                    timeline.start()
+                    # Доставка подхватывает и недоставленные пачки предыдущего лидера
+                    _worker = asyncio.create_task(outbox.run_worker(bot))
+                    _is_leader = True
+                    print(f"👑 {WORKER_ID}: планувальник і розсилки працюють на цьому воркері")
+                elif not leading and _is_leader:
+                    _is_leader = False
+                    await _stop_delivery()
+                    timeline.stop()
+                    timeline.clear()
+                    print(f"⚠️ {WORKER_ID}: роль планувальника передано іншому воркеру")
+
+            rows = await db.run(changes.fetch, last_seq)
+            if rows:
+                last_seq = rows[-1]['seq']
+                await _apply_changes(rows, timeline)
+
+            if _is_leader:
+                # Окно планировщика: догружаем события, подошедшие к горизонту
+                await refill_jobs(timeline)
+
+            if _is_leader and now - last_cleanup > CHANGES_RETENTION:
+                await db.run(changes.cleanup, int(now) - CHANGES_RETENTION)
+                last_cleanup = now
+        except Exception as e:
+            print("Leader loop error:", e)
+        try:
+            await asyncio.wait_for(_changed.wait(), CHANGES_POLL)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start(bot, timeline):
+    """Запускает run() фоновой задачей (остановка — release())."""
+    global _task
+    _task = asyncio.create_task(run(bot, timeline))
+
+
+async def release():
+    """Отдаёт аренду при штатной остановке, чтобы следующий воркер не ждал LEASE_TTL."""
+    global _is_leader, _task
+    # Сначала останавливаем цикл: иначе на следующем heartbeat (или уже идущем _acquire) он снова возьмёт аренду
+    if _task is not None:
+        _task.cancel()
+        await asyncio.wait({_task})
+        _task = None
+    # Без проверки _is_leader: цикл мог быть отменён между взятием аренды и установкой флага;
+    # DELETE затрагивает только нашу аренду
+    _is_leader = False
+    await _stop_delivery()
+    await db.run(_release, WORKER_ID)
@@ -0,0 +1,263 @@
+"""Метрики процесу: лічильники, гістограми й gauge у пам'яті та їх віддача у форматі Prometheus.
+
+Метрики оголошуються на рівні модуля там, де вимірюються, наприклад:
+    SEND_SECONDS = metrics.histogram('broadcast_send_seconds', 'Час відправки', labels=('status',))
+    SEND_SECONDS.observe(0.12, 'delivered')
+Значення змінюються лише з event loop (запити до БД вимірюються в db.run, а не в потоці БД).
+"""
+import math
+import time
+from aiohttp import web
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Межі кошиків за замовчуванням (секунди): від мілісекунд до хвилини
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Затримки подій відносно запланованого часу (секунди)
+LAG_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 900)
+
+STARTED_AT = time.time()
+
+_registry = {}
+
+
+def _label_str(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _fmt(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def values(self):
+        return dict(self._values)
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name, _label_str(self.labels, labels), value
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        self._values[labels] = value
+
+
+class Callback:
+    """Значення, що обчислюється під час збору (розмір черги, кешу тощо).
+
+    fn повертає число або {кортеж значень міток: число}.
+    """
+
+    def __init__(self, name, help, fn, labels=(), kind='gauge'):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labels = tuple(labels)
+        self.kind = kind
+
+    def samples(self):
+        try:
+            values = self.fn()
+        except Exception as e:
+            print(f"Metric {self.name} failed:", e)
+            return
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in values.items():
+            yield self.name, _label_str(self.labels, labels), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+        # labels -> [лічильники кошиків (не кумулятивні), сума, кількість, мінімум, максимум]
+        self._series = {}
+
+    def observe(self, value, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0, value, value]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+        series[3] = min(series[3], value)
+        series[4] = max(series[4], value)
+
+    def time(self, *labels):
+        """Контекстний менеджер: with HIST.time('label'): ..."""
+        return _Timer(self, labels)
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def series(self):
+        return list(self._series)
+
+    def quantile(self, q, *labels):
+        """Оцінка квантиля за кошиками (лінійна інтерполяція, як histogram_quantile у Prometheus).
+
+        Межі кошика обрізаються спостереженими мінімумом і максимумом, тож значення нижче
+        першої межі чи в +Inf не зсуваються до найближчої межі.
+        """
+        series = self._series.get(labels)
+        if not series or not series[2]:
+            return None
+        _, _, total, low, high = series
+        rank = q * total
+        seen = 0
+        lower = -math.inf
+        for bound, count in zip(self.buckets, series[0]):
+            if count and seen + count >= rank:
+                start, end = max(lower, low), min(bound, high)
+                return start + (end - start) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return high
+
+    def samples(self):
+        for labels, (counts, total, count, _, _) in self._series.items():
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                yield (self.name + '_bucket',
+                       _label_str(self.labels + ('le',), labels + (_fmt(bound),)), cumulative)
+            yield self.name + '_sum', _label_str(self.labels, labels), total
+            yield self.name + '_count', _label_str(self.labels, labels), count
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        self.histogram.observe(self.elapsed, *self.labels)
+
+
+def _register(metric):
+    # Повторне оголошення (наприклад, при перезавантаженні модуля) повертає вже наявну метрику
+    existing = _registry.get(metric.name)
+    if existing is not None and type(existing) is type(metric):
+        return existing
+    _registry[metric.name] = metric
+    return metric
+
+
+def counter(name, help, labels=()):
+    return _register(Counter(name, help, labels))
+
+
+def gauge(name, help, labels=()):
+    return _register(Gauge(name, help, labels))
+
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, help, labels, buckets))
+
+
+def callback(name, help, fn, labels=(), kind='gauge'):
+    # Колбек завжди замінюється: він може посилатися на новий об'єкт (timeline тощо)
+    metric = Callback(name, help, fn, labels, kind)
+    _registry[name] = metric
+    return metric
+
+
+def get(name):
+    return _registry.get(name)
+
+
+def value(name, *labels):
+    """Поточне значення лічильника, gauge чи колбека (для гістограми — кількість спостережень)."""
+    metric = _registry.get(name)
+    if metric is None:
+        return None
+    if isinstance(metric, Histogram):
+        return metric.count(*labels)
+    if isinstance(metric, Callback):
+        values = metric.fn()
+        return values.get(labels) if isinstance(values, dict) else values
+    return metric.value(*labels)
+
+
+callback('process_uptime_seconds', 'Час роботи процесу', lambda: round(time.time() - STARTED_AT, 1))
+
+
+def render():
+    """Усі метрики в текстовому форматі Prometheus (exposition format 0.0.4)."""
+    lines = []
+    for name in sorted(_registry):
+        metric = _registry[name]
+        lines.append(f"# HELP {name} {metric.help}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for sample_name, labels, value in metric.samples():
+            lines.append(f"{sample_name}{labels} {_fmt(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+async def _handle(request):
+    return web.Response(body=render().encode(), headers={'Content-Type': CONTENT_TYPE})
+
+
+_runner = None
+
+
+async def serve(host, port):
+    """Запускає HTTP-сервер з /metrics (окремо від вебхука, на локальному порту)."""
+    global _runner
+    app = web.Application()
+    app.router.add_get('/metrics', _handle)
+    _runner = web.AppRunner(app, access_log=None)
+    await _runner.setup()
+    try:
+        await web.TCPSite(_runner, host, port).start()
+    except OSError as e:
+        # Порт уже зайнятий (кілька воркерів на одному хості) — бот працює далі без /metrics
+        print(f"⚠️ Метрики не запущено на {host}:{port}: {e}")
+        await _runner.cleanup()
+        _runner = None
+        return
+    print(f"📈 Метрики: http://{host}:{port}/metrics")
+
+
+async def stop():
+    global _runner
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
@@ -0,0 +1,379 @@
+import asyncio
+import time
+from database import changes, db
+from locales.strings import get_text
+from services import metrics
+from services.broadcast import broadcast
+
+# Колонка user_prefs, которая включает каждое действие
+ACTION_PREFS = {
+    'off': 'notify_off_10',
+    'off_now': 'notify_off',
+    'on': 'notify_on_10',
+    'on_now': 'notify_on',
+}
+
+# Очерёдность в общем лимите отправок: «уже выключили/включили» важнее напоминаний, напоминания — «график обновлён»
+ACTION_PRIORITY = {
+    'off_now': 0,
+    'on_now': 0,
+    'off': 1,
+    'on': 1,
+}
+UPDATE_PRIORITY = 2
+
+# Страховочный опрос outbox, если доставку никто не разбудил
+POLL_INTERVAL = 30
+# Как часто фиксировать обработанных получателей (столько сообщений может повториться после сбоя)
+FLUSH_EVERY = 50
+# Сколько хранить доставленные пачки
+RETENTION = 7 * 24 * 3600
+CLEANUP_INTERVAL = 3600
+# Как часто wait() проверяет в БД пачки, которые доставляет другой процесс
+WAIT_POLL = 2
+# После стольких неудачных попыток доставки пачка получает статус 'failed' и больше не повторяется
+MAX_ATTEMPTS = 5
+# Предел длины одного сообщения-дайджеста (у Telegram — 4096 символов)
+MAX_TEXT = 4000
+
+DELIVERY_LAG = metrics.histogram('outbox_delivery_lag_seconds', 'От времени события (due_at) до конца доставки пачки',
+                                 labels=('kind',), buckets=metrics.LAG_BUCKETS)
+SAVED = metrics.counter('outbox_saved_total', 'Отправки, сэкономленные объединением в дайджест')
+# Отклонение доставки каждого сообщения от due_at (отрицательное — раньше срока)
+SKEW = metrics.histogram('outbox_delivery_skew_seconds', 'Доставка относительно времени события', labels=('action',),
+                         buckets=(-600, -300, -120, -60, -30, -10, -5, -1, 0, 1, 5, 10, 30, 60, 120, 300, 600))
+
+_wake = asyncio.Event()
+_in_flight = set()
+# Задачи доставки (_process): при потере лидерства отменяются, чтобы не слать параллельно с новым лидером
+_deliveries = set()
+_waiters = {}
+
+
+def reminder_batch(company, queue, date_str, interval, action, due_at=None):
+    """Пачка для события графика; ключ уникален для (очередь, дата, интервал, действие).
+
+    due_at — время события; рассылка начинается сразу (для большой очереди планировщик будит её заранее).
+    События одной минуты попадают в одну группу: подписчик нескольких очередей получит одно сообщение.
+    """
+    run_at = int(time.time())
+    due_at = int(due_at if due_at is not None else run_at)
+    return {
+        'dedup_key': f"reminder:{company}:{queue}:{date_str}:{interval}:{action}",
+        'kind': 'reminder',
+        'company': company,
+        'queue': queue,
+        'date': date_str,
+        'action': action,
+        'run_at': run_at,
+        'due_at': due_at,
+        'group_key': f"reminder:{due_at // 60}",
+    }
+
+
+def update_batch(company, queue, date_str, upload_id):
+    """Пачка «графік оновлено» для одной очереди; пачки одной загрузки объединяются в дайджест."""
+    now = int(time.time())
+    return {
+        'dedup_key': f"update:{company}:{queue}:{date_str}:{upload_id}",
+        'kind': 'update',
+        'company': company,
+        'queue': queue,
+        'date': date_str,
+        'action': None,
+        'run_at': now,
+        'due_at': now,
+        'group_key': f"update:{upload_id}",
+    }
+
+
+def _insert(conn, batches):
+    ids = []
+    for b in batches:
+        conn.execute(
+            "INSERT OR IGNORE INTO outbox (dedup_key, kind, company, queue, date, action, run_at, due_at, group_key) "
+            "VALUES (:dedup_key, :kind, :company, :queue, :date, :action, :run_at, :due_at, :group_key)", b
+        )
+        ids.append(conn.execute("SELECT id FROM outbox WHERE dedup_key = ?", (b['dedup_key'],)).fetchone()['id'])
+    # Доставку веде лидер; если пачки поставил другой воркер, лидер узнает об этом из журнала
+    changes.log(conn, changes.OUTBOX)
+    return ids
+
+
+def wake():
+    """Будит доставку (новые пачки поставлены другим процессом)."""
+    _wake.set()
+
+
+async def enqueue(batches):
+    """Записывает пачки в outbox (повтор dedup_key игнорируется) и будит доставку. Возвращает id строк."""
+    ids = await db.run(_insert, batches)
+    _wake.set()
+    return ids
+
+
+def _render(batch, lang):
+    if batch['kind'] == 'update':
+        return get_text(lang, 'update_notify', company=batch['company'], queue=batch['queue'], date=batch['date'])
+    # action: 'off'/'on' (напоминание за 10 минут) или 'off_now'/'on_now' (в момент события)
+    action = batch['action']
+    key = f'reminder_{action}' if action in ('off', 'on') else action
+    return get_text(lang, key, company=batch['company'], queue=batch['queue'])
+
+
+async def _recipients(batch):
+    """Получатели пачки, которым ещё ничего не отправляли: {user_id: язык}."""
+    rows = await db.fetchall(
+        "SELECT u.user_id FROM users u WHERE u.company = ? AND u.queue = ? AND u.active = 1 AND NOT EXISTS "
+        "(SELECT 1 FROM outbox_sent s WHERE s.outbox_id = ? AND s.user_id = u.user_id)",
+        (batch['company'], batch['queue'], batch['id'])
+    )
+    prefs = await db.get_prefs_many([row['user_id'] for row in rows])
+    pref_key = ACTION_PREFS.get(batch['action'])
+    return {uid: p['language'] for uid, p in prefs.items()
+            if pref_key is None or int(p[pref_key]) == 1}
+
+
+def _priority(batch):
+    return ACTION_PRIORITY.get(batch['action'], UPDATE_PRIORITY)
+
+
+def _due(batch):
+    # Пачки, поставленные до миграции 8, без due_at
+    return batch['due_at'] if batch['due_at'] is not None else batch['run_at']
+
+
+def _digest(batches, lang):
+    """Тексты для одного получателя: [(text, пачки в этом тексте), ...].
+
+    Одна пачка — обычное сообщение; несколько — одно сообщение-дайджест
+    (делится на части, только если не помещается в MAX_TEXT).
+    """
+    if len(batches) == 1:
+        return [(_render(batches[0], lang), batches)]
+    if batches[0]['kind'] == 'update':
+        head = get_text(lang, 'update_digest')
+        lines = [get_text(lang, 'update_digest_item', company=b['company'], queue=b['queue'], date=b['date'])
+                 for b in batches]
+    else:
+        head = None
+        lines = [_render(b, lang) for b in batches]
+    parts = []
+    text, part = head, []
+    for line, batch in zip(lines, batches):
+        if part and len(text) + len(line) + 1 > MAX_TEXT:
+            parts.append((text, part))
+            text, part = head, []
+        text = f"{text}\n{line}" if text else line
+        part.append(batch)
+    parts.append((text, part))
+    return parts
+
+
+async def _deliver(bot, batches):
+    """Доставляет группу пачек: каждому получателю — одно сообщение на все его пачки группы."""
+    recipients = {}
+    for batch in batches:
+        for uid, lang in (await _recipients(batch)).items():
+            recipients.setdefault((uid, lang), []).append(batch)
+
+    # Текст зависит только от набора пачек и языка: рендерим по разу на такую пару, а не на получателя
+    texts = {}
+    messages = []
+    for (uid, lang), items in recipients.items():
+        key = (tuple(b['id'] for b in items), lang)
+        parts = texts.get(key)
+        if parts is None:
+            parts = texts[key] = _digest(items, lang)
+        messages.extend((uid, text, part) for text, part in parts)
+
+    counters = {b['id']: {'delivered': 0, 'failed': 0, 'blocked': 0, 'saved': 0} for b in batches}
+    # Отклонения доставок от due_at по пачкам — для отчёта о каждом событии
+    skews = {b['id']: [] for b in batches}
+    processed = []
+    unreachable = []
+
+    async def flush():
+        rows = processed[:]
+        processed.clear()
+        await db.executemany("INSERT OR IGNORE INTO outbox_sent (outbox_id, user_id) VALUES (?, ?)", rows)
+        if unreachable:
+            rows = unreachable[:]
+            unreachable.clear()
+            await db.deactivate_users(rows)
+
+    async def on_unreachable(chat_id, reason):
+        # Заблокировал бота / удалён: больше не тратим на него отправки, пока не пришлёт /start
+        unreachable.append((chat_id, reason))
+
+    async def on_result(chat_id, status, part):
+        now = time.time()
+        # Фиксируем и недоставленных: повторы уже были внутри broadcast
+        for i, batch in enumerate(part):
+            processed.append((batch['id'], chat_id))
+            counters[batch['id']][status] += 1
+            if status == 'delivered':
+                skew = now - _due(batch)
+                skews[batch['id']].append(skew)
+                SKEW.observe(skew, batch['action'] or 'update')
+            if i:
+                # Эта пачка ушла в сообщении вместе с первой — отдельной отправки не было
+                counters[batch['id']]['saved'] += 1
+        if len(processed) >= FLUSH_EVERY:
+            await flush()
+
+    priority = min(_priority(b) for b in batches)
+    try:
+        stats = await broadcast(bot, messages, on_result=on_result, on_unreachable=on_unreachable, priority=priority)
+    finally:
+        # И при отмене (смена лидера): новый лидер не повторит уже отправленное
+        await flush()
+    await db.executemany(
+        "UPDATE outbox SET status = 'done', done_at = CURRENT_TIMESTAMP, "
+        "delivered = delivered + ?, failed = failed + ?, blocked = blocked + ?, saved = saved + ?, "
+        "skew_first = COALESCE(skew_first, ?), skew_last = COALESCE(?, skew_last) WHERE id = ?",
+        [(c['delivered'], c['failed'], c['blocked'], c['saved'],
+          min(skews[batch_id], default=None), max(skews[batch_id], default=None), batch_id)
+         for batch_id, c in counters.items()]
+    )
+    saved = sum(c['saved'] for c in counters.values())
+    SAVED.inc(amount=saved)
+    now = time.time()
+    for batch in batches:
+        DELIVERY_LAG.observe(max(now - _due(batch), 0), batch['kind'])
+    all_skews = sorted(skew for values in skews.values() for skew in values)
+    skew_report = (f", отклонение от срока {all_skews[0]:+.1f} / {all_skews[len(all_skews) // 2]:+.1f} / "
+                   f"{all_skews[-1]:+.1f} с (первое / медиана / последнее)" if all_skews else "")
+    print(f"Outbox {batches[0]['group_key'] or batches[0]['dedup_key']}: пачек {len(batches)}, "
+          f"сообщений {len(messages)}, сэкономлено отправок {saved}, {stats}{skew_report}")
+    return counters
+
+
+def _resolve(batch_id, stats):
+    future = _waiters.pop(batch_id, None)
+    if future and not future.done():
+        future.set_result(stats)
+
+
+def _record_failure(conn, ids, error):
+    conn.executemany(
+        "UPDATE outbox SET attempts = attempts + 1, last_error = ?, "
+        "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE status END WHERE id = ?",
+        [(error, MAX_ATTEMPTS, batch_id) for batch_id in ids]
+    )
+
+
+async def _process(bot, batches):
+    try:
+        for batch_id, stats in (await _deliver(bot, batches)).items():
+            _resolve(batch_id, stats)
+    except Exception as e:
+        # Строки остаются pending и будут повторены при следующем проходе (не больше MAX_ATTEMPTS раз)
+        print(f"Outbox {[b['id'] for b in batches]} delivery failed:", e)
+        try:
+            await db.run(_record_failure, [b['id'] for b in batches], str(e)[:500])
+        except Exception as db_error:
+            print("Outbox: не удалось записать ошибку доставки:", db_error)
+    finally:
+        for batch in batches:
+            _in_flight.discard(batch['id'])
+
+
+def _cleanup(conn, before):
+    conn.execute(
+        "DELETE FROM outbox_sent WHERE outbox_id IN "
+        "(SELECT id FROM outbox WHERE status IN ('done', 'failed') AND run_at < ?)", (before,)
+    )
+    conn.execute("DELETE FROM outbox WHERE status IN ('done', 'failed') AND run_at < ?", (before,))
+
+
+async def run_worker(bot):
+    """Фоновая доставка: забирает созревшие pending-пачки, включая оставшиеся с прошлого запуска."""
+    last_cleanup = 0
+    while True:
+        _wake.clear()
+        try:
+            now = int(time.time())
+            due = await db.fetchall(
+                "SELECT * FROM outbox WHERE status = 'pending' AND run_at <= ? ORDER BY run_at, id", (now,)
+            )
+            # Созревшие пачки одной группы доставляются одной задачей; пачки без группы — по одной
+            groups = {}
+            for batch in due:
+                if batch['id'] not in _in_flight:
+                    groups.setdefault(batch['group_key'] or batch['dedup_key'], []).append(batch)
+            # Срочные группы стартуют первыми (а токены отправки и так достаются им раньше)
+            for batches in sorted(groups.values(), key=lambda g: (min(_priority(b) for b in g), _due(g[0]))):
+                _in_flight.update(b['id'] for b in batches)
+                task = asyncio.create_task(_process(bot, batches))
+                _deliveries.add(task)
+                task.add_done_callback(_deliveries.discard)
+            if now - last_cleanup > CLEANUP_INTERVAL:
+                await db.run(_cleanup, now - RETENTION)
+                last_cleanup = now
+        except Exception as e:
+            print("Outbox worker error:", e)
+        try:
+            await asyncio.wait_for(_wake.wait(), POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def stop():
+    """Отменяет идущие доставки и ждёт их завершения. Пачки остаются pending:
+    новый лидер продолжит с последнего зафиксированного получателя (повторится не больше FLUSH_EVERY)."""
+    tasks = list(_deliveries)
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+        print(f"Outbox: остановлено доставок — {len(tasks)}")
+
+
+async def wait(ids, timeout=None):
+    """Ждёт доставки пачек и возвращает суммарные счётчики.
+
+    batches_failed — пачки, брошенные после MAX_ATTEMPTS неудачных попыток;
+    batches_pending — не завершённые за timeout секунд (None — ждать без ограничения).
+    """
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    futures = [_waiters.setdefault(i, loop.create_future()) for i in ids]
+    failed_batches = set()
+    while True:
+        # Пачки, доставленные раньше (повторный dedup_key) или другим воркером-лидером, берём из БД
+        pending = [i for i, f in zip(ids, futures) if not f.done()]
+        if not pending:
+            break
+        finished = await db.fetchall(
+            f"SELECT id, status, delivered, failed, blocked, saved FROM outbox "
+            f"WHERE status IN ('done', 'failed') AND id IN ({','.join('?' * len(pending))})",
+            pending
+        )
+        for row in finished:
+            if row['status'] == 'failed':
+                failed_batches.add(row['id'])
+            stats = {key: row[key] for key in ('delivered', 'failed', 'blocked', 'saved')}
+            _resolve(row['id'], stats)
+            # Свой future мог уже уйти из _waiters (другой wait() вышел по таймауту)
+            future = futures[ids.index(row['id'])]
+            if not future.done():
+                future.set_result(stats)
+        if all(f.done() for f in futures):
+            break
+        left = WAIT_POLL if deadline is None else min(WAIT_POLL, deadline - loop.time())
+        if left <= 0:
+            break
+        await asyncio.wait([f for f in futures if not f.done()], timeout=left)
+
+    total = {'delivered': 0, 'failed': 0, 'blocked': 0, 'saved': 0,
+             'batches_failed': len(failed_batches), 'batches_pending': 0}
+    for batch_id, future in zip(ids, futures):
+        if not future.done():
+            total['batches_pending'] += 1
+            if _waiters.get(batch_id) is future:
+                del _waiters[batch_id]
+            continue
+        for key in ('delivered', 'failed', 'blocked', 'saved'):
+            total[key] += future.result()[key]
+    return total
@@ -1,48 +1,69 @@
 import re
 from datetime import datetime
 
-def parse_schedule_text(text):
-    lines = text.split('\n')
-    if not lines: return None, None, []
-
-    header = lines[0].strip().upper()
-    # Regex: Шукаємо КОМПАНІЮ та ДАТУ (dd.mm.yyyy)
-    match = re.search(r'^(ЦЕК|ДТЕК|DTEK)\s+(\d{2}\.\d{2}\.\d{4})', header)
-    
-    if not match:
-        return None, None, []
-
-    company = "ЦЕК" if "ЦЕК" in match.group(1) else "ДТЕК"
-    date_str = match.group(2) # 29.01.2026
-    
-    # Конвертуємо в YYYY-MM-DD для БД
-    try:
-        date_obj = datetime.strptime(date_str, '%d.%m.%Y')
-        db_date = date_obj.strftime('%Y-%m-%d')
-    except ValueError:
-        return None, None, []
-
-    current_queue = ""
-    results = []
-
-    for line in lines[1:]:
-        line = line.strip()
-        if not line: continue
-
-        queue_match = re.search(r'(?:Черга|Група)\s*(\d+\.\d+)', line, re.IGNORECASE)
-        if queue_match:
-            current_queue = queue_match.group(1)
-            continue
-            
-        time_match = re.findall(r'(\d{1,2}:\d{2})\s*[-—–]\s*(\d{1,2}:\d{2})', line)
-        if time_match and current_queue:
+# Regex: Шукаємо КОМПАНІЮ та ДАТУ (dd.mm.yyyy) — компілюємо один раз
+HEADER_RE = re.compile(r'^(ЦЕК|ДТЕК|DTEK)\s+(\d{2}\.\d{2}\.\d{4})')
+QUEUE_RE = re.compile(r'(?:Черга|Група)\s*(\d+\.\d+)', re.IGNORECASE)
+TIME_RE = re.compile(r'(\d{1,2}:\d{2})\s*[-—–]\s*(\d{1,2}:\d{2})')
+
+
+class ScheduleParser:
+    """Потоковий парсер графіків: багато блоків «ЦЕК/ДТЕК dd.mm.yyyy» в одному тексті чи файлі.
+
+    Ітерація віддає записи по одному; після неї доступні blocks — (company, date) у порядку
+    появи — та errors — (номер рядка, рядок, причина).
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.blocks = []
+        self.errors = []
+
+    def __iter__(self):
+        company = db_date = None
+        current_queue = ""
+
+        for line_no, line in enumerate(self.lines, start=1):
+            line = line.strip()
+            if not line: continue
+
+            header = HEADER_RE.search(line.upper())
+            if header:
+                current_queue = ""
+                company = "ЦЕК" if "ЦЕК" in header.group(1) else "ДТЕК"
+                # Конвертуємо в YYYY-MM-DD для БД
+                try:
+                    db_date = datetime.strptime(header.group(2), '%d.%m.%Y').strftime('%Y-%m-%d')
+                except ValueError:
+                    company = db_date = None
+                    self.errors.append((line_no, line, "невірна дата"))
+                    continue
+                if (company, db_date) not in self.blocks:
+                    self.blocks.append((company, db_date))
+                continue
+
+            if not company:
+                self.errors.append((line_no, line, "немає заголовка «ДТЕК dd.mm.yyyy»"))
+                continue
+
+            queue_match = QUEUE_RE.search(line)
+            if queue_match:
+                current_queue = queue_match.group(1)
+                continue
+
+            time_match = TIME_RE.findall(line)
+            if not time_match:
+                self.errors.append((line_no, line, "рядок не розпізнано"))
+                continue
+            if not current_queue:
+                self.errors.append((line_no, line, "інтервал без черги"))
+                continue
+
             for start, end in time_match:
-                results.append({
+                yield {
                     'company': company,
                     'queue': current_queue,
                     'date': db_date,
                     'off_time': start.zfill(5),
                     'on_time': end.zfill(5)
-                })
-
-    return company, db_date, results
\ No newline at end of file
+                }
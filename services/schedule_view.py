@@ -0,0 +1,50 @@
+from database.cache import LRUCache
+from locales.strings import catalog
+from services import metrics
+
+# Сколько дней вперёд можно листать график
+DAYS_AHEAD = 6
+
+RENDER_SECONDS = metrics.histogram('schedule_view_seconds', 'Подготовка экрана графика (из кэша или из БД)',
+                                   buckets=(0.0001, 0.00025, 0.0005) + metrics.DEFAULT_BUCKETS)
+
+# Готовые экраны графика: (company, queue, date, lang) -> (text, reply_markup).
+# Сбрасываются при загрузке графика (в том числе на других воркерах — через журнал изменений)
+# и целиком при смене дня: кнопки листания посчитаны от «сегодня»
+_cache = LRUCache(maxsize=20000, ttl=3600)
+# День, от которого построены экраны в кэше
+_today = None
+
+
+def _rollover(today):
+    global _today
+    if today != _today:
+        _cache.invalidate()
+        _today = today
+
+
+def get(company, queue, date_str, lang, today):
+    _rollover(today)
+    return _cache.get((company, queue, date_str, lang))
+
+
+def put(company, queue, date_str, lang, view, today):
+    _rollover(today)
+    _cache.set((company, queue, date_str, lang), view)
+
+
+def invalidate(slices):
+    """Сбрасывает экраны изменённых очередей [(company, queue, date), ...] на всех языках."""
+    langs = catalog.loaded()
+    for company, queue, date_str in slices:
+        for lang in langs:
+            _cache.invalidate((company, queue, date_str, lang))
+
+
+def observe(seconds):
+    RENDER_SECONDS.observe(seconds)
+
+
+def stats():
+    """Попадания в кэш (задержка подготовки экрана — в RENDER_SECONDS)."""
+    return _cache.stats()
@@ -1,90 +1,200 @@
-import pytz
-from datetime import datetime, timedelta
-from database.db import get_db
-from locales.strings import get_text
-
-# Принудительная часовая зона
-UA_TZ = pytz.timezone('Europe/Kyiv')
-
-async def send_reminder(bot, user_id, company, queue, action, lang):
-    """Отправляет напоминание пользователю."""
-    # action может быть: 'off'/'on' (reminder за 10 минут) или 'off_now'/'on_now' (уведомление в момент события)
-    if action in ('off', 'on'):
-        key = f'reminder_{action}'
-    else:
-        key = action  # off_now / on_now
-    text = get_text(lang, key, company=company, queue=queue)
-    try:
-        await bot.send_message(user_id, text)
-    except Exception as e:
-        print(f"Ошибка отправки напоминания {user_id}: {e}")
-
-async def rebuild_jobs(bot, scheduler):
-    """Перестраивает все задания планировщика."""
-    try:
-        scheduler.remove_all_jobs()
-    except Exception:
-        pass
-
-    now_ua = datetime.now(UA_TZ)
-    today_str = now_ua.strftime('%Y-%m-%d')
-
-    with get_db() as conn:
-        schedules = conn.execute("SELECT * FROM schedules WHERE date >= ?", (today_str,)).fetchall()
-
-        for sched in schedules:
-            try:
-                date_str = sched['date']
-                off_time_raw = sched['off_time'] or ''
-                on_time_raw = sched['on_time'] or ''
-
-                # Заменяем '24:00' на '23:59' для корректного парсинга
-                off_time_str = off_time_raw.replace('24:00', '23:59')
-                on_time_str = on_time_raw.replace('24:00', '23:59')
-
-                # Парсим datetime (в локальном Kyiv tz)
-                off_dt_naive = datetime.strptime(f"{date_str} {off_time_str}", '%Y-%m-%d %H:%M')
-                on_dt_naive = datetime.strptime(f"{date_str} {on_time_str}", '%Y-%m-%d %H:%M')
-                off_t = UA_TZ.localize(off_dt_naive)
-                on_t = UA_TZ.localize(on_dt_naive)
-
-                # Получаем подписанных пользователей вместе с их prefs
-                users = conn.execute(
-                    "SELECT u.user_id, COALESCE(p.language, 'uk') as language, "
-                    "COALESCE(p.notify_off, 1) as notify_off, COALESCE(p.notify_on, 1) as notify_on, "
-                    "COALESCE(p.notify_off_10, 1) as notify_off_10, COALESCE(p.notify_on_10, 1) as notify_on_10 "
-                    "FROM users u LEFT JOIN user_prefs p ON u.user_id = p.user_id "
-                    "WHERE u.company=? AND u.queue=?",
-                    (sched['company'], sched['queue'])
-                ).fetchall()
-
-                for user in users:
-                    user_id = user['user_id']
-                    lang = user['language'] or 'uk'
-
-                    # Напоминание о выключении за 10 минут
-                    rem_off = off_t - timedelta(minutes=10)
-                    if rem_off > now_ua and int(user['notify_off_10']) == 1:
-                        scheduler.add_job(send_reminder, 'date', run_date=rem_off,
-                                          args=[bot, user_id, sched['company'], sched['queue'], 'off', lang])
-
-                    # Уведомление в момент выключения
-                    if off_t > now_ua and int(user['notify_off']) == 1:
-                        scheduler.add_job(send_reminder, 'date', run_date=off_t,
-                                          args=[bot, user_id, sched['company'], sched['queue'], 'off_now', lang])
-
-                    # Напоминание о включении за 10 минут
-                    rem_on = on_t - timedelta(minutes=10)
-                    if rem_on > now_ua and int(user['notify_on_10']) == 1:
-                        scheduler.add_job(send_reminder, 'date', run_date=rem_on,
-                                          args=[bot, user_id, sched['company'], sched['queue'], 'on', lang])
-
-                    # Уведомление в момент включения
-                    if on_t > now_ua and int(user['notify_on']) == 1:
-                        scheduler.add_job(send_reminder, 'date', run_date=on_t,
-                                          args=[bot, user_id, sched['company'], sched['queue'], 'on_now', lang])
-
-            except Exception as e:
-                # печатаем информацию, чтобы не ломать запуск
-                print("Error scheduling jobs for schedule row:", dict(sched))
-                print(e)
+import time
+from datetime import datetime
+import config
+from database import db
+from database.schedule_events import UA_TZ
+from services import broadcast, metrics, outbox
+
+# События, пропущенные из-за рестарта не раньше чем столько назад (сек), доотправляются при старте
+MISSED_GRACE = 15 * 60
+
+# В timeline лежат только события из окна [сейчас, _horizon); окно сдвигается шагами по REFILL_STEP
+WINDOW = int(config.SCHEDULER_WINDOW_HOURS * 3600)
+REFILL_STEP = min(10 * 60, WINDOW // 2)
+
+# Большая рассылка стартует заранее: её длительность оценивается по активным подписчикам всех очередей
+# с событием в эту минуту и по скорости отправки. Напоминания должны закончиться к сроку,
+# а «уже выключили/включили» — разойтись вокруг момента события (половина до, половина после)
+CENTERED_ACTIONS = ('off_now', 'on_now')
+MAX_LEAD = 10 * 60
+
+REBUILD_SECONDS = metrics.histogram('scheduler_rebuild_seconds', 'Длительность rebuild_jobs')
+RESCHEDULE_SECONDS = metrics.histogram('scheduler_reschedule_seconds', 'Перепланирование изменённых очередей')
+REFILL_SECONDS = metrics.histogram('scheduler_refill_seconds', 'Дозаполнение окна планировщика')
+
+# Индекс событий в timeline: (company, queue, date) -> ключи событий
+_slice_events = {}
+# Время самого события для ключа (в timeline лежит время старта рассылки) и ключи по минутам событий
+_targets = {}
+_minute_events = {}
+# Активные подписчики по очередям: (company, queue) -> количество (обновляется вместе с окном)
+_audience = {}
+# Граница загруженного окна (unix time) и дата (по Киеву), на которую чистился индекс
+_horizon = 0
+_today = None
+
+
+def horizon():
+    return _horizon
+
+
+def _active_queues(conn, queues):
+    """Очереди [(company, queue), ...], у которых есть хотя бы один активный подписчик."""
+    return {q for q in set(queues) if conn.execute(
+        "SELECT 1 FROM users WHERE company = ? AND queue = ? AND active = 1 LIMIT 1", q
+    ).fetchone()}
+
+def _audience_counts(conn):
+    return {(row['company'], row['queue']): row['n'] for row in conn.execute(
+        "SELECT company, queue, COUNT(*) AS n FROM users WHERE active = 1 GROUP BY company, queue"
+    )}
+
+def _lead(total, action):
+    """На сколько секунд раньше события начать рассылку total сообщений."""
+    duration = broadcast.estimate_seconds(total)
+    return int(min(duration / 2 if action in CENTERED_ACTIONS else duration, MAX_LEAD))
+
+def _plan(timeline, minutes):
+    """Ставит события минут minutes в timeline с опережением под суммарный размер их рассылок.
+
+    Все события минуты стартуют в одну секунду (с наибольшим из опережений) — одной пачкой outbox,
+    иначе подписчик нескольких очередей получил бы отдельные сообщения вместо дайджеста.
+    """
+    for minute in minutes:
+        keys = _minute_events.get(minute)
+        if not keys:
+            continue
+        total = sum(_audience.get(key[:2], 0) for key in keys)
+        start = min(_targets[key] for key in keys) - max(_lead(total, key[4]) for key in keys)
+        for key in keys:
+            timeline.add(start, key)
+
+def _forget(key):
+    run_at = _targets.pop(key, None)
+    if run_at is not None:
+        keys = _minute_events.get(run_at // 60)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del _minute_events[run_at // 60]
+    return run_at
+
+async def fire_events(keys):
+    """Срабатывание событий графика (пачка за одну секунду): всё уходит в outbox одной транзакцией."""
+    # Подписчиков и их настройки читаем при доставке, поэтому
+    # изменения подписок/настроек не требуют перепланирования.
+    # Очереди без активных подписчиков пропускаем сразу — без пустых пачек в outbox
+    due = {key: _forget(key) for key in keys}
+    active = await db.run(_active_queues, [key[:2] for key in keys])
+    batches = [outbox.reminder_batch(*key, due_at=due[key]) for key in keys if key[:2] in active]
+    if batches:
+        await outbox.enqueue(batches)
+
+def _schedule_events(timeline, events, now, catch_up=None):
+    """Добавляет в timeline готовые события из schedule_events (без привязки к пользователям).
+
+    Если передан список catch_up, недавно пропущенные события добавляются в него пачками outbox.
+    """
+    minutes = set()
+    for event in events:
+        key = (event['company'], event['queue'], event['date'], event['interval'], event['action'])
+        if event['run_at'] <= now:
+            if catch_up is not None and now - event['run_at'] <= MISSED_GRACE:
+                catch_up.append(outbox.reminder_batch(*key, due_at=event['run_at']))
+            continue
+        # Стабильный ключ: повторное добавление переносит, а не дублирует событие
+        _forget(key)
+        _targets[key] = event['run_at']
+        _minute_events.setdefault(event['run_at'] // 60, set()).add(key)
+        minutes.add(event['run_at'] // 60)
+        _slice_events.setdefault(key[:3], set()).add(key)
+    _plan(timeline, minutes)
+
+def _fetch_slices(conn, slices, until):
+    rows = []
+    for slice_key in slices:
+        rows.extend(conn.execute(
+            "SELECT * FROM schedule_events WHERE company=? AND queue=? AND date=? AND run_at < ?", (*slice_key, until)
+        ).fetchall())
+    return rows
+
+def _rollover(timeline):
+    """Смена суток: из индекса убираются ключи уже сработавших событий прошлых дат."""
+    global _today
+    today = datetime.now(UA_TZ).strftime('%Y-%m-%d')
+    if today == _today:
+        return
+    _today = today
+    for slice_key in [s for s in _slice_events if s[2] < today]:
+        keys = {key for key in _slice_events[slice_key] if key in timeline}
+        if keys:
+            # Интервал через полночь: включение ещё впереди
+            _slice_events[slice_key] = keys
+        else:
+            del _slice_events[slice_key]
+
+async def reschedule_slices(timeline, slices):
+    """Пересоздаёт события только для изменённых очередей [(company, queue, date), ...] за один проход."""
+    # Минуты, где убрали события: рассылки остальных очередей там стали меньше — опережение пересчитывается
+    minutes = set()
+    for slice_key in slices:
+        for key in _slice_events.pop(slice_key, ()):
+            timeline.cancel(key)
+            run_at = _forget(key)
+            if run_at is not None:
+                minutes.add(run_at // 60)
+
+    # События за границей окна подтянет refill_jobs — уже из новой версии графика
+    with RESCHEDULE_SECONDS.time():
+        events = await db.run(_fetch_slices, slices, _horizon)
+        _plan(timeline, minutes)
+        _schedule_events(timeline, events, int(time.time()))
+
+async def refill_jobs(timeline):
+    """Сдвигает окно планировщика: догружает события до now + WINDOW (вызывается лидером периодически)."""
+    global _horizon
+    now = int(time.time())
+    if now + WINDOW - _horizon < REFILL_STEP:
+        return
+    with REFILL_SECONDS.time():
+        until = now + WINDOW
+        counts = await db.run(_audience_counts)
+        _audience.clear()
+        _audience.update(counts)
+        events = await db.fetchall(
+            "SELECT * FROM schedule_events WHERE run_at >= ? AND run_at < ?", (max(_horizon, now), until)
+        )
+        _schedule_events(timeline, events, now)
+        _horizon = until
+        _rollover(timeline)
+
+async def rebuild_jobs(timeline):
+    """Восстанавливает таймеры событий ближайших WINDOW секунд (при получении роли лидера).
+
+    Дальше окно сдвигает refill_jobs. Недоставленные рассылки подхватывает outbox; события, пропущенные за время
+    простоя (не старше MISSED_GRACE), ставятся в outbox с dedup-ключом — без повторов.
+    """
+    global _horizon, _today
+    with REBUILD_SECONDS.time() as timer:
+        timeline.clear()
+        _slice_events.clear()
+        _targets.clear()
+        _minute_events.clear()
+        _audience.clear()
+        _audience.update(await db.run(_audience_counts))
+
+        now = int(time.time())
+        _horizon = now + WINDOW
+        _today = datetime.now(UA_TZ).strftime('%Y-%m-%d')
+        events = await db.fetchall(
+            "SELECT * FROM schedule_events WHERE run_at >= ? AND run_at < ?", (now - MISSED_GRACE, _horizon)
+        )
+        missed = []
+        _schedule_events(timeline, events, now, catch_up=missed)
+        if missed:
+            active = await db.run(_active_queues, [(b['company'], b['queue']) for b in missed])
+            missed = [b for b in missed if (b['company'], b['queue']) in active]
+        if missed:
+            await outbox.enqueue(missed)
+            print(f"Outbox: доотправка пропущенных событий — {len(missed)}")
+    print(f"⏱ rebuild_jobs: событий {len(timeline)} за {timer.elapsed:.3f} с")
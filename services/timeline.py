@@ -0,0 +1,102 @@
+import asyncio
+import heapq
+import time
+from services import metrics
+
+LAG_SECONDS = metrics.histogram('scheduler_lag_seconds', 'Запаздывание срабатывания относительно run_at',
+                                buckets=metrics.LAG_BUCKETS)
+FIRED = metrics.counter('scheduler_events_fired_total', 'Сработавшие события timeline')
+
+
+class Timeline:
+    """Лёгкий планировщик событий: min-heap компактных записей (run_at, key) и один asyncio-таск.
+
+    key — любой хешируемый кортеж, например (company, queue, date, interval, action).
+    add — O(log n); cancel — O(1) (ленивое удаление, куча периодически уплотняется).
+    Все события, наступившие в одну и ту же секунду, передаются обработчику одной пачкой.
+    """
+
+    def __init__(self, handler):
+        self._handler = handler
+        self._heap = []
+        self._live = {}
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._live)
+
+    def __contains__(self, key):
+        return key in self._live
+
+    def add(self, run_at, key):
+        """Добавляет (или переносит) событие; run_at — unix time."""
+        self._live[key] = run_at
+        heapq.heappush(self._heap, (run_at, key))
+        if self._heap[0][1] == key:
+            # Новое событие раньше текущего ожидания — будим таймер
+            self._wake.set()
+
+    def cancel(self, key):
+        if self._live.pop(key, None) is not None and len(self._heap) > 2 * len(self._live) + 1024:
+            self._compact()
+
+    def clear(self):
+        self._heap.clear()
+        self._live.clear()
+
+    def _compact(self):
+        self._heap = [(run_at, key) for key, run_at in self._live.items()]
+        heapq.heapify(self._heap)
+
+    def _peek(self):
+        """Ближайшее живое событие (отменённые и перенесённые записи выбрасываются)."""
+        while self._heap:
+            run_at, key = self._heap[0]
+            if self._live.get(key) == run_at:
+                return run_at
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now):
+        """Забирает все события с run_at в пределах текущей секунды."""
+        due = []
+        limit = int(now) + 1
+        while True:
+            run_at = self._peek()
+            if run_at is None or run_at >= limit:
+                return due
+            _, key = heapq.heappop(self._heap)
+            del self._live[key]
+            due.append(key)
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            run_at = self._peek()
+            timeout = None if run_at is None else max(run_at - time.time(), 0)
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+            now = time.time()
+            due = self.pop_due(now)
+            if due:
+                # run_at — самое раннее из сработавших событий
+                LAG_SECONDS.observe(max(now - run_at, 0))
+                FIRED.inc(amount=len(due))
+                try:
+                    await self._handler(due)
+                except Exception as e:
+                    print("Timeline handler error:", e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,102 @@
+from database import changes, schedule_events
+
+INSERT_CHUNK = 500
+
+
+def diff_intervals(old, new):
+    """Порівнює інтервали однієї черги. old/new — множини (off_time, on_time).
+
+    Повертає {'added': [...], 'removed': [...], 'changed': [(старий, новий), ...]};
+    «змінений» — інтервал, у якого збігся початок або кінець.
+    """
+    added = sorted(new - old)
+    removed = sorted(old - new)
+    changed = []
+    for match_index in (0, 1):
+        for interval in list(removed):
+            pair = next((a for a in added if a[match_index] == interval[match_index]), None)
+            if pair:
+                changed.append((interval, pair))
+                removed.remove(interval)
+                added.remove(pair)
+    return {'added': added, 'removed': removed, 'changed': sorted(changed)}
+
+
+def _apply_block(conn, company, date_str, queues):
+    """Записує лише різницю для одного блоку. Повертає {queue: diff} для змінених черг."""
+    stored = {}
+    for row in conn.execute(
+        "SELECT id, queue, off_time, on_time FROM schedules WHERE company = ? AND date = ?", (company, date_str)
+    ).fetchall():
+        stored.setdefault(row['queue'], {}).setdefault((row['off_time'], row['on_time']), []).append(row['id'])
+
+    result = {}
+    to_delete = []
+    removed_rows = []
+    to_insert = []
+    # Черга, якої немає в новому блоці, вважається знятою з графіка
+    for queue in stored.keys() | queues.keys():
+        old = stored.get(queue, {})
+        new = queues.get(queue, set())
+        # Дублікати вже збереженого інтервалу видаляються завжди, лишається один рядок
+        for interval in old.keys() & new:
+            to_delete.extend((row_id,) for row_id in old[interval][1:])
+        diff = diff_intervals(set(old), new)
+        if not (diff['added'] or diff['removed'] or diff['changed']):
+            continue
+        result[queue] = diff
+        for off, on in old.keys() - new:
+            to_delete.extend((row_id,) for row_id in old[(off, on)])
+            removed_rows.append((company, queue, date_str, off, on))
+        to_insert.extend((company, queue, date_str, off, on) for off, on in new - old.keys())
+
+    conn.executemany("DELETE FROM schedules WHERE id = ?", to_delete)
+    for i in range(0, len(to_insert), INSERT_CHUNK):
+        conn.executemany(
+            "INSERT INTO schedules (company, queue, date, off_time, on_time) VALUES (?,?,?,?,?)",
+            to_insert[i:i + INSERT_CHUNK]
+        )
+    # Події графіка оновлюються в тій самій транзакції, що й рядки
+    schedule_events.drop(conn, removed_rows)
+    schedule_events.materialize(conn, to_insert)
+    return result
+
+
+def store_schedules(conn, parser):
+    """Розбирає вхід і зберігає всі блоки в одній транзакції, записуючи тільки зміни.
+
+    Повертає {(company, date): {queue: diff}}; блок без змін має порожній словник.
+    """
+    blocks = {}
+    for item in parser:
+        queues = blocks.setdefault((item['company'], item['date']), {})
+        queues.setdefault(item['queue'], set()).add((item['off_time'], item['on_time']))
+
+    # Блок без інтервалів очищає графік на цю дату
+    for key in parser.blocks:
+        blocks.setdefault(key, {})
+
+    diffs = {key: _apply_block(conn, key[0], key[1], queues) for key, queues in blocks.items()}
+    # Лідер планувальника підхопить змінені черги з журналу, навіть якщо завантаження прийшло на інший воркер
+    changes.log_slices(conn, [(company, queue, date_str) for (company, date_str), queues in diffs.items() for queue in queues])
+    return diffs
+
+
+def format_diff(diffs):
+    """Короткий звіт для адміна: по рядку на змінену чергу."""
+    lines = []
+    for (company, date_str), queues in diffs.items():
+        if not queues:
+            lines.append(f"➖ {company} ({date_str}): без змін")
+            continue
+        lines.append(f"✅ {company} ({date_str}): змінено черг — {len(queues)}")
+        for queue, diff in sorted(queues.items()):
+            parts = []
+            if diff['added']:
+                parts.append("+" + ", ".join(f"{off}-{on}" for off, on in diff['added']))
+            if diff['removed']:
+                parts.append("−" + ", ".join(f"{off}-{on}" for off, on in diff['removed']))
+            if diff['changed']:
+                parts.append("~" + ", ".join(f"{o[0]}-{o[1]}→{n[0]}-{n[1]}" for o, n in diff['changed']))
+            lines.append(f"  {queue}: " + "; ".join(parts))
+    return lines
@@ -0,0 +1,91 @@
+import asyncio
+import hmac
+import re
+from aiohttp import web
+from aiogram.dispatcher.webhook import WebhookRequestHandler, RESPONSE_TIMEOUT
+import config
+from services import dispatch
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+# Дозволені символи secret_token у Telegram Bot API
+SECRET_RE = re.compile(r'[A-Za-z0-9_-]{1,256}')
+
+# Обмеження одночасної обробки (лише для DISPATCH_MODE='default'); створюється в setup(), коли вже є event loop
+_slots = None
+# Апдейти, що ще обробляються (зокрема ті, на які Telegram уже отримав відповідь)
+_in_flight = set()
+
+
+async def _process(dispatcher, update):
+    try:
+        await dispatcher.updates_handler.notify(update)
+    except Exception as e:
+        print(f"Webhook update {update.update_id} failed:", e)
+    finally:
+        _slots.release()
+
+
+class SecureWebhookHandler(WebhookRequestHandler):
+    """Приймає апдейти лише з правильним секретом.
+
+    З OrderedDispatcher апдейт ставиться в чергу свого чату (services/dispatch.py): паралельність обмежує
+    DISPATCH_MAX_CONCURRENCY, а поки черги переповнені (DISPATCH_MAX_QUEUE), відповідь Telegram затримується.
+    Зі звичайним Dispatcher обробляється не більше WEBHOOK_MAX_CONCURRENCY апдейтів одночасно; поки всі слоти
+    зайняті, відповідь теж затримується — Telegram сам пригальмовує доставку.
+    Якщо обробка не вклалася в RESPONSE_TIMEOUT, відповідаємо «ok», а апдейт доробляється у фоні.
+    """
+
+    async def post(self):
+        # Без секрету будь-хто, хто знає URL, міг би підробити апдейт від адміна
+        if not config.WEBHOOK_SECRET or not hmac.compare_digest(
+                self.request.headers.get(SECRET_HEADER, ''), config.WEBHOOK_SECRET):
+            raise web.HTTPUnauthorized()
+
+        dispatcher = self.get_dispatcher()
+        update = await self.parse_update(dispatcher.bot)
+
+        if isinstance(dispatcher, dispatch.OrderedDispatcher):
+            # Черги по чатах самі обмежують паралельність; поки вони переповнені, відповідь затримується
+            done = await dispatch.submit(dispatcher, update)
+            await asyncio.wait({done}, timeout=RESPONSE_TIMEOUT)
+            return web.Response(text='ok')
+
+        await _slots.acquire()
+        task = asyncio.create_task(_process(dispatcher, update))
+        _in_flight.add(task)
+        task.add_done_callback(_in_flight.discard)
+        # wait не скасовує задачу: обірване з'єднання не перериває обробку
+        await asyncio.wait({task}, timeout=RESPONSE_TIMEOUT)
+        return web.Response(text='ok')
+
+
+def setup():
+    """Створює aiohttp-застосунок з маршрутом вебхука. Без коректного WEBHOOK_SECRET не запускається."""
+    global _slots
+    if not SECRET_RE.fullmatch(config.WEBHOOK_SECRET):
+        raise RuntimeError("RUN_MODE=webhook потребує WEBHOOK_SECRET (1-256 символів: A-Z, a-z, 0-9, _ і -)")
+    _slots = asyncio.Semaphore(config.WEBHOOK_MAX_CONCURRENCY)
+    app = web.Application()
+    app.router.add_route('*', config.WEBHOOK_PATH, SecureWebhookHandler, name='webhook_handler')
+    return app
+
+
+async def register(bot):
+    """Реєструє вебхук у Telegram. Апдейти, що прийшли під час рестарту, не скидаються."""
+    if not config.WEBHOOK_HOST:
+        print("⚠️ WEBHOOK_HOST не задано — вебхук не реєструється (локальний запуск)")
+        return
+    await bot.set_webhook(
+        config.WEBHOOK_HOST.rstrip('/') + config.WEBHOOK_PATH,
+        secret_token=config.WEBHOOK_SECRET,
+        max_connections=min(config.WEBHOOK_MAX_CONCURRENCY, 100),
+    )
+
+
+async def drain(timeout):
+    """Чекає завершення апдейтів, що ще обробляються (при зупинці)."""
+    if _in_flight:
+        print(f"Webhook: очікування {len(_in_flight)} апдейтів...")
+        _, pending = await asyncio.wait(set(_in_flight), timeout=timeout)
+        if pending:
+            print(f"Webhook: не завершено за {timeout} с — {len(pending)}")